@@ -1,11 +1,14 @@
 import streamlit as st
 import cv2
 import numpy as np
-import tempfile
 import os
+import shutil
 import time
+import threading
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 import biomechanics
 import video_processor
@@ -22,8 +25,152 @@ st.set_page_config(
 )
 
 # Load custom CSS
-with open('.streamlit/style.css') as f:
-    st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+@st.cache_resource(show_spinner=False)
+def load_stylesheet(path='.streamlit/style.css'):
+    with open(path) as f:
+        return f'<style>{f.read()}</style>'
+
+st.markdown(load_stylesheet(), unsafe_allow_html=True)
+
+# Cached analysis helpers
+# Results are keyed on the session ID and frame count; the processed results
+# themselves are passed with a leading underscore so Streamlit doesn't hash them
+def session_metrics(session_data):
+    if session_data.get('metrics') is None:
+        # Sessions that only carry per-frame dicts get their metric array built once
+        session_data['metrics'] = biomechanics.metrics_to_array(session_data.get('processed_results', []))
+    return session_data['metrics']
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_time_series(session_id, num_frames, _session_data):
+    return biomechanics.extract_time_series_data(session_metrics(_session_data))
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_bowling_phases(session_id, num_frames, _session_data):
+    return biomechanics.identify_bowling_phases(session_metrics(_session_data))
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_performance_metrics(session_id, num_frames, _biomechanics_data, _session_data):
+    return biomechanics.calculate_performance_metrics(
+        _biomechanics_data, session_metrics(_session_data), _session_data.get('phases')
+    )
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_sessions_table(num_sessions, last_session_id, _session_history):
+    sessions_df = pd.DataFrame.from_records(
+        _session_history, columns=['id', 'name', 'bowler', 'type', 'date']
+    ).rename(columns={
+        'id': 'Session ID',
+        'name': 'Name',
+        'bowler': 'Bowler',
+        'type': 'Type',
+        'date': 'Date'
+    })
+    sessions_df = sessions_df.astype({
+        'Session ID': 'string',
+        'Name': 'string',
+        'Bowler': 'string',
+        'Type': 'category'
+    })
+    sessions_df['Date'] = pd.to_datetime(sessions_df['Date'], errors='coerce')
+    return sessions_df
+
+# Annotated frames are already JPEG encoded on disk, so keep the bytes of the
+# recently viewed ones around and hand them to st.image as-is. Passing
+# output_format="JPEG" lets Streamlit forward them without re-encoding
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_frame_bytes(frame_path):
+    with open(frame_path, 'rb') as f:
+        return f.read()
+
+def load_comparison_data(session):
+    # Runs on a worker thread, so the loaded session is cached by the caller on the script thread
+    loaded_session = data_handler.load_session(session['id'], cache=False)
+    
+    # Fall back to the history entry if the full session can't be loaded
+    session_data = loaded_session or session
+    if 'processed_results' not in session_data:
+        session_data['processed_results'] = []
+    
+    # Extract time series data and calculate performance metrics
+    num_frames = len(session_data['processed_results'])
+    time_series = cached_time_series(session['id'], num_frames, session_data)
+    metrics = cached_performance_metrics(session['id'], num_frames, time_series, session_data)
+    return loaded_session, time_series, metrics
+
+# Frame navigation runs as a fragment so moving through the frames only
+# reruns this part of the page, not the tabs below it
+@st.fragment
+def frame_navigator(processed_results):
+    col1, col2 = st.columns([3, 1])
+    
+    with col1:
+        # Frame slider
+        # Safety check for processed_results
+        if processed_results:
+            frame_count = len(processed_results)
+            if frame_count > 0:
+                # Initialize frame_index if needed
+                if not hasattr(st.session_state, 'frame_index') or st.session_state.frame_index >= frame_count:
+                    st.session_state.frame_index = 0
+                
+                st.session_state.frame_index = st.slider("Frame", 0, frame_count-1, st.session_state.frame_index)
+                
+                # Display current frame with landmarks
+                current_result = processed_results[st.session_state.frame_index]
+                frame_placeholder = st.empty()
+                
+                # Check if the frame is available (it might be None if loaded from DB)
+                if current_result and current_result.get('frame_path') and os.path.exists(current_result['frame_path']):
+                    frame_placeholder.image(load_frame_bytes(current_result['frame_path']), caption=f"Frame {st.session_state.frame_index}", use_column_width=True, output_format="JPEG")
+                    
+                    # Read the neighbouring frames ahead so Previous/Next are served from memory
+                    for neighbour in (st.session_state.frame_index - 1, st.session_state.frame_index + 1):
+                        if 0 <= neighbour < frame_count:
+                            neighbour_path = processed_results[neighbour].get('frame_path')
+                            if neighbour_path and os.path.exists(neighbour_path):
+                                load_frame_bytes(neighbour_path)
+                else:
+                    # Display a placeholder for frame data
+                    st.info("Frame image not available - using simplified data from database")
+                    # Display a placeholder image with the VIT-AP logo
+                    frame_placeholder.image("attached_assets/vitap.png", caption="Frame data not stored in database", use_column_width=True)
+            else:
+                st.warning("No frames available in the processed results.")
+        else:
+            st.warning("No processed results available for this session.")
+    
+    with col2:
+        st.subheader("Frame Controls")
+        col_prev, col_next = st.columns(2)
+        
+        with col_prev:
+            if st.button("◀ Previous") and hasattr(st.session_state, 'frame_index'):
+                st.session_state.frame_index = max(0, st.session_state.frame_index - 1)
+                st.rerun(scope="fragment")
+        
+        with col_next:
+            if st.button("Next ▶"):
+                # Initialize frame_count if needed
+                frame_count = len(processed_results) if processed_results else 0
+                if frame_count > 0:  # Only proceed if there are frames
+                    st.session_state.frame_index = min(frame_count - 1, st.session_state.frame_index + 1)
+                    st.rerun(scope="fragment")
+        
+        # Display frame biomechanics - with additional safety checks
+        if processed_results and 0 <= st.session_state.frame_index < len(processed_results):
+            current_result = processed_results[st.session_state.frame_index]
+            if current_result and 'biomechanics' in current_result and current_result['biomechanics']:
+                st.subheader("Current Frame Metrics")
+                biometrics = current_result['biomechanics']
+                st.metric("Arm Angle", f"{biometrics.get('arm_angle', 0):.1f}°")
+                st.metric("Wrist Angle", f"{biometrics.get('wrist_angle', 0):.1f}°")
+                st.metric("Trunk Angle", f"{biometrics.get('trunk_angle', 0):.1f}°")
+                st.metric("Front Knee Angle", f"{biometrics.get('front_knee_angle', 0):.1f}°")
+            else:
+                st.warning("No biomechanical data detected in this frame")
+        else:
+            st.warning("No frames available for biomechanical analysis")
 
 # Initialize session state variables if they don't exist
 if 'current_session_data' not in st.session_state:
@@ -38,57 +185,8 @@ if 'session_history' not in st.session_state:
     st.session_state.session_history = data_handler.load_session_history()
 if 'selected_session' not in st.session_state:
     st.session_state.selected_session = None
-
-# Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        text-align: center;
-        padding: 0;
-        margin-bottom: 2rem;
-    }
-    .university-logo {
-        max-width: 300px; 
-        margin: 0 auto;
-        display: block;
-    }
-    .developer-info {
-        text-align: center;
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 5px;
-        margin-bottom: 1.5rem;
-    }
-    .metrics-container {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 5px;
-    }
-    .st-emotion-cache-1kyxreq {
-        margin-top: -60px;
-    }
-    .subheader {
-        font-size: 1.5rem;
-        font-weight: bold;
-        margin-bottom: 1rem;
-        color: #aa0000;
-    }
-    .tab-content {
-        padding: 1rem;
-        border: 1px solid #e6e6e6;
-        border-radius: 5px;
-    }
-    .sidebar .stRadio {
-        background-color: #f0f2f6; 
-        padding: 1rem;
-        border-radius: 5px;
-    }
-    .tips-box {
-        border-left: 3px solid #aa0000;
-        padding-left: 1rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+if 'saved_sessions' not in st.session_state:
+    st.session_state.saved_sessions = {}
 
 # App title and logo
 col1, col2 = st.columns([1, 2])
@@ -156,92 +254,138 @@ if app_mode == "Record New Session":
             uploaded_file = st.file_uploader("Upload bowling video", type=['mp4', 'mov', 'avi'])
             
             if uploaded_file is not None:
-                # Save uploaded file to temp file
-                tfile = tempfile.NamedTemporaryFile(delete=False)
-                tfile.write(uploaded_file.read())
-                video_path = tfile.name
-                
                 st.video(uploaded_file)
                 
+                analysis_stride = st.sidebar.slider(
+                    "Analysis stride", 1, 5, 1,
+                    help="Run pose estimation on every nth frame and interpolate the frames in between"
+                )
+                analysis_resolution = st.sidebar.select_slider(
+                    "Analysis resolution", options=[256, 384, 480, 720], value=video_processor.DEFAULT_ANALYSIS_RESOLUTION,
+                    help="Short side in pixels that frames are downscaled to before pose estimation"
+                )
+                
                 if st.button("Process Video"):
+                    video_hash = utils.content_hash(uploaded_file.getbuffer())
+                    if analysis_stride > 1:
+                        # Sessions analysed with different settings aren't interchangeable
+                        video_hash = f"{video_hash}-stride{analysis_stride}"
+                    if analysis_resolution != video_processor.DEFAULT_ANALYSIS_RESOLUTION:
+                        video_hash = f"{video_hash}-{analysis_resolution}p"
+                    
+                    # Reuse the saved session if this exact video has been processed before
+                    existing_session = data_handler.load_session_by_hash(video_hash)
+                    if existing_session:
+                        st.info("This video has already been processed - loading the saved session.")
+                        data_handler.close_current_session()
+                        st.session_state.current_session_data = existing_session
+                        st.session_state.processed_frames = existing_session.get('processed_results', [])
+                        st.session_state.biomechanics_data = cached_time_series(existing_session['id'], len(st.session_state.processed_frames), existing_session)
+                        st.session_state.frame_index = 0
+                        
+                        # Navigate to analysis page
+                        st.session_state.app_mode = "Analyze Session"
+                        st.rerun()
+                    
+                    # Only write the upload to disk once it is actually going to be processed.
+                    # getbuffer() exposes the uploaded bytes without copying them
+                    video_path = utils.write_temp_file(uploaded_file.getbuffer(), suffix=os.path.splitext(uploaded_file.name)[1])
+                    
+                    # Set once processing starts writing frames, and once the session is saved
+                    frames_dir = None
+                    session_saved = False
                     try:
-                        with st.spinner("Processing video..."):
-                            st.info("Step 1: Extracting frames from video...")
+                        with st.status("Processing video...", expanded=True) as status:
+                            status.write("Step 1: Extracting frames from video...")
                             # Process the video
-                            frames, fps = video_processor.extract_frames(video_path)
-                            if frames:
-                                processed_results = []
+                            frames, fps, frame_count, frame_scale = video_processor.extract_frames(video_path, max_short_side=analysis_resolution)
+                            if frame_count:
+                                session_id = utils.generate_id()
+                                frames_dir = data_handler.get_frames_dir(session_id)
+                                results_by_index = {}
                                 progress_bar = st.progress(0)
+                                progress_step = max(1, frame_count // 100)
+                                last_progress = (0, time.monotonic())
                                 
-                                st.info(f"Step 2: Processing {len(frames)} frames with MediaPipe...")
-                                for i, frame in enumerate(frames):
-                                    try:
-                                        # Process frame with MediaPipe
-                                        processed_frame, landmarks = video_processor.process_frame(frame)
-                                        
-                                        # Extract biomechanics if landmarks were detected
-                                        if landmarks:
-                                            biomechanics_data = biomechanics.extract_biomechanics(landmarks, frame.shape)
-                                            processed_results.append({
-                                                'frame': processed_frame,
-                                                'landmarks': landmarks,
-                                                'biomechanics': biomechanics_data
-                                            })
-                                        else:
-                                            processed_results.append({
-                                                'frame': processed_frame,
-                                                'landmarks': None,
-                                                'biomechanics': None
-                                            })
+                                status.write(f"Step 2: Processing {frame_count} frames with MediaPipe...")
+                                with utils.gc_disabled():
+                                    for i, frame_path, landmarks, frame_measurements in video_processor.process_frames_parallel(frames, frame_count, frames_dir, frame_scale, fps, analysis_stride):
+                                        results_by_index[i] = (frame_path, landmarks, frame_measurements)
                                         
-                                        # Update progress
-                                        progress_bar.progress((i + 1) / len(frames))
-                                    except Exception as frame_error:
-                                        st.error(f"Error processing frame {i}: {str(frame_error)}")
-                                        raise
+                                        # Results arrive a batch at a time, so update progress at most
+                                        # once per percent and once every 200 ms
+                                        completed = len(results_by_index)
+                                        now = time.monotonic()
+                                        if completed - last_progress[0] >= progress_step and now - last_progress[1] >= 0.2:
+                                            progress_bar.progress(min(1.0, completed / frame_count))
+                                            last_progress = (completed, now)
+                                progress_bar.progress(1.0)
                                 
-                                st.info("Step 3: Creating session data...")
+                                if not results_by_index:
+                                    raise Exception("No frames could be decoded from the video")
+                                frame_paths, frame_landmarks, frame_metrics = zip(*(results_by_index[i] for i in range(len(results_by_index))))
+                                frame_landmarks = np.stack(frame_landmarks)
+                                frame_metrics = np.stack(frame_metrics)
+                                processed_results = biomechanics.results_from_arrays(frame_landmarks, frame_metrics, frame_paths)
+                                status.write(f"Extracted {len(processed_results)} frames from video at {fps:.2f} fps")
+                                
+                                status.write("Step 3: Creating session data...")
                                 # Save session data
                                 session_data = {
-                                    'id': utils.generate_id(),
+                                    'id': session_id,
                                     'name': session_name,
                                     'bowler': bowler_name,
                                     'type': bowling_type,
                                     'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                    'video_hash': video_hash,
                                     'processed_results': processed_results,
-                                    'fps': fps
+                                    'landmarks': frame_landmarks,
+                                    'metrics': frame_metrics,
+                                    'phases': biomechanics.identify_bowling_phases(frame_metrics),
+                                    'fps': fps,
+                                    'frame_scale': frame_scale
                                 }
                                 
-                                st.info("Step 4: Updating session state...")
+                                status.write("Step 4: Updating session state...")
+                                data_handler.close_current_session()
                                 st.session_state.current_session_data = session_data
                                 st.session_state.processed_frames = processed_results
                                 
-                                st.info("Step 5: Extracting time series data...")
+                                status.write("Step 5: Extracting time series data...")
                                 # Extract biomechanics time series data
-                                st.session_state.biomechanics_data = biomechanics.extract_time_series_data(processed_results)
+                                st.session_state.biomechanics_data = cached_time_series(session_id, len(processed_results), session_data)
                                 
-                                st.info("Step 6: Saving to database...")
+                                status.write("Step 6: Saving to database...")
                                 # Save session to history
                                 save_result = data_handler.save_session(session_data)
                                 if not save_result:
                                     st.error("Failed to save session to database!")
                                     raise Exception("Database save error")
+                                session_saved = True
                                 
-                                st.info("Step 7: Loading updated session history...")
-                                st.session_state.session_history = data_handler.load_session_history()
+                                status.write("Step 7: Updating session history...")
+                                # Add the new session's metadata rather than reloading the whole history
+                                st.session_state.session_history.append(data_handler.session_summary(session_data))
                                 
-                                st.success("Video processed and saved successfully!")
+                                status.update(label="Video processed and saved successfully!", state="complete")
                                 
                                 # Navigate to analysis page
                                 st.session_state.app_mode = "Analyze Session"
                                 st.rerun()
+                            else:
+                                st.error("Could not read any frames from the video")
+                                status.update(label="Video processing failed", state="error")
                     except Exception as e:
                         st.error(f"Error processing video: {str(e)}")
                         import traceback
                         st.code(traceback.format_exc())
-                
-                # Clean up the temp file
-                os.unlink(video_path)
+                    finally:
+                        # Clean up the temp file, including when st.rerun() ends the script
+                        os.unlink(video_path)
+                        
+                        # Nothing refers to the frames of a session that wasn't saved, so remove them
+                        if frames_dir and not session_saved:
+                            shutil.rmtree(frames_dir, ignore_errors=True)
         
         elif source_option == "Use Webcam":
             st.warning("Webcam recording functionality is not yet implemented in this version.")
@@ -293,39 +437,12 @@ elif app_mode == "Analyze Session":
         
         # Handling case where processed_results might have None frame data
         # This is likely when loading from the database with our simplified storage approach
-        if processed_results and 'frame' in processed_results[0] and processed_results[0]['frame'] is None:
+        if processed_results and processed_results[0].get('frame_path') is None:
             st.info("Using simplified analysis with biomechanics data only (frames not loaded from database)")
             
             # If we need frame data for display later, we could regenerate it here or show placeholders
         
         # Session information in a nice container
-        st.markdown("""
-        <style>
-        .session-info {
-            background-color: #f0f2f6;
-            border-radius: 10px;
-            padding: 15px;
-            margin-bottom: 20px;
-            display: flex;
-            justify-content: space-between;
-        }
-        .session-item {
-            text-align: center;
-            padding: 0 15px;
-        }
-        .session-label {
-            font-size: 0.8rem;
-            color: #555;
-            margin-bottom: 5px;
-        }
-        .session-value {
-            font-size: 1.1rem;
-            font-weight: bold;
-            color: #111;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
         st.markdown(f"""
         <div class="session-info">
             <div class="session-item">
@@ -348,67 +465,7 @@ elif app_mode == "Analyze Session":
         """, unsafe_allow_html=True)
         
         # Frame navigation
-        col1, col2 = st.columns([3, 1])
-        
-        with col1:
-            # Frame slider
-            # Safety check for processed_results
-            if processed_results:
-                frame_count = len(processed_results)
-                if frame_count > 0:
-                    # Initialize frame_index if needed
-                    if not hasattr(st.session_state, 'frame_index') or st.session_state.frame_index >= frame_count:
-                        st.session_state.frame_index = 0
-                    
-                    st.session_state.frame_index = st.slider("Frame", 0, frame_count-1, st.session_state.frame_index)
-                    
-                    # Display current frame with landmarks
-                    current_result = processed_results[st.session_state.frame_index]
-                    
-                    # Check if the frame is available (it might be None if loaded from DB)
-                    if current_result and current_result.get('frame') is not None:
-                        st.image(current_result['frame'], caption=f"Frame {st.session_state.frame_index}", use_column_width=True)
-                    else:
-                        # Display a placeholder for frame data
-                        st.info("Frame image not available - using simplified data from database")
-                        # Display a placeholder image with the VIT-AP logo
-                        st.image("attached_assets/vitap.png", caption="Frame data not stored in database", use_column_width=True)
-                else:
-                    st.warning("No frames available in the processed results.")
-            else:
-                st.warning("No processed results available for this session.")
-        
-        with col2:
-            st.subheader("Frame Controls")
-            col_prev, col_next = st.columns(2)
-            
-            with col_prev:
-                if st.button("◀ Previous") and hasattr(st.session_state, 'frame_index'):
-                    st.session_state.frame_index = max(0, st.session_state.frame_index - 1)
-                    st.rerun()
-            
-            with col_next:
-                if st.button("Next ▶"):
-                    # Initialize frame_count if needed
-                    frame_count = len(processed_results) if processed_results else 0
-                    if frame_count > 0:  # Only proceed if there are frames
-                        st.session_state.frame_index = min(frame_count - 1, st.session_state.frame_index + 1)
-                        st.rerun()
-            
-            # Display frame biomechanics - with additional safety checks
-            if processed_results and 0 <= st.session_state.frame_index < len(processed_results):
-                current_result = processed_results[st.session_state.frame_index]
-                if current_result and 'biomechanics' in current_result and current_result['biomechanics']:
-                    st.subheader("Current Frame Metrics")
-                    biometrics = current_result['biomechanics']
-                    st.metric("Arm Angle", f"{biometrics.get('arm_angle', 0):.1f}°")
-                    st.metric("Wrist Angle", f"{biometrics.get('wrist_angle', 0):.1f}°")
-                    st.metric("Trunk Angle", f"{biometrics.get('trunk_angle', 0):.1f}°")
-                    st.metric("Front Knee Angle", f"{biometrics.get('front_knee_angle', 0):.1f}°")
-                else:
-                    st.warning("No biomechanical data detected in this frame")
-            else:
-                st.warning("No frames available for biomechanical analysis")
+        frame_navigator(processed_results)
         
         # Detailed analysis tabs
         st.subheader("Detailed Analysis")
@@ -423,7 +480,12 @@ elif app_mode == "Analyze Session":
         
         with tab2:
             # Key phases of the bowling action
-            phases = biomechanics.identify_bowling_phases(session_data['processed_results'])
+            # Phases are detected once when the video is processed
+            phases = session_data.get('phases')
+            if not phases:
+                # Sessions saved before that get their phases detected and stored on first view
+                phases = cached_bowling_phases(session_data['id'], len(processed_results), session_data)
+                data_handler.store_session_phases(session_data, phases)
             if phases:
                 st.subheader("Key Bowling Phases")
                 
@@ -432,33 +494,35 @@ elif app_mode == "Analyze Session":
                 
                 for i, (phase_name, frame_idx) in enumerate(phases.items()):
                     with phase_cols[i]:
-                        st.markdown(f"**{phase_name}**")
                         if frame_idx is not None and 0 <= frame_idx < len(processed_results):
                             phase_result = processed_results[frame_idx]
                             
                             # Check if frame is available
-                            if phase_result.get('frame') is not None:
-                                st.image(phase_result['frame'], use_column_width=True)
+                            if phase_result.get('frame_path') and os.path.exists(phase_result['frame_path']):
+                                st.image(load_frame_bytes(phase_result['frame_path']), use_column_width=True, output_format="JPEG")
                             else:
                                 # Show placeholder
                                 st.info(f"Phase {phase_name} frame not available")
                                 st.image("attached_assets/vitap.png", width=150)
                             
+                            # The phase title and its metrics go below the image as one element
+                            body = [f"**{phase_name}**"]
                             if phase_result and 'biomechanics' in phase_result and phase_result['biomechanics']:
                                 biometrics = phase_result['biomechanics']
                                 # Use get() with defaults to prevent KeyError
-                                metrics = [
+                                body.extend([
                                     f"Arm Angle: {biometrics.get('arm_angle', 0):.1f}°",
                                     f"Wrist Angle: {biometrics.get('wrist_angle', 0):.1f}°",
                                     f"Trunk Angle: {biometrics.get('trunk_angle', 0):.1f}°"
-                                ]
-                                st.markdown("<br>".join(metrics), unsafe_allow_html=True)
+                                ])
+                            # Markdown hard line breaks keep this a single plain element
+                            st.markdown("  \n".join(body))
                             
                             if st.button(f"Go to {phase_name}", key=f"goto_{phase_name}"):
                                 st.session_state.frame_index = frame_idx
                                 st.rerun()
                         else:
-                            st.info("Phase not detected")
+                            st.info(f"**{phase_name}**  \nPhase not detected")
             else:
                 st.warning("Could not identify distinct bowling phases")
         
@@ -466,7 +530,7 @@ elif app_mode == "Analyze Session":
             # Performance metrics
             st.subheader("Performance Metrics")
             
-            metrics = biomechanics.calculate_performance_metrics(st.session_state.biomechanics_data, processed_results)
+            metrics = cached_performance_metrics(session_data['id'], len(processed_results), st.session_state.biomechanics_data, session_data)
             
             col1, col2 = st.columns(2)
             
@@ -494,9 +558,10 @@ elif app_mode == "Analyze Session":
                 suggestions = biomechanics.generate_suggestions(metrics)
                 
                 if suggestions:
-                    for area, suggestion in suggestions.items():
-                        st.markdown(f"**{area}:**")
-                        st.markdown(f"{suggestion}")
+                    # One markdown element for all suggestions rather than two per suggestion
+                    st.markdown("\n\n".join(
+                        f"**{area}:**  \n{suggestion}" for area, suggestion in suggestions.items()
+                    ))
                 else:
                     st.info("No improvement suggestions available")
         
@@ -512,35 +577,33 @@ elif app_mode == "Session History":
     if not st.session_state.session_history:
         st.info("No previous sessions found.")
     else:
+        # Index the history once so lookups by session ID are constant time
+        history = st.session_state.session_history
+        history_by_id = {session['id']: session for session in history}
+        history_names = {session_id: session['name'] for session_id, session in history_by_id.items()}
+        session_ids = list(history_by_id)
+        
         # Display sessions in a table
-        sessions_df = pd.DataFrame([
-            {
-                'Session ID': session['id'],
-                'Name': session['name'],
-                'Bowler': session['bowler'],
-                'Type': session['type'],
-                'Date': session['date']
-            }
-            for session in st.session_state.session_history
-        ])
+        sessions_df = cached_sessions_table(len(history), history[-1]['id'], history)
         
         st.dataframe(sessions_df, use_container_width=True)
         
         # Session selection
         selected_session_id = st.selectbox(
             "Select a session to view", 
-            options=[session['id'] for session in st.session_state.session_history],
-            format_func=lambda x: next((s['name'] for s in st.session_state.session_history if s['id'] == x), x)
+            options=session_ids,
+            format_func=history_names.get
         )
         
         if st.button("Load Selected Session"):
             # Load the selected session
-            selected_session = next((s for s in st.session_state.session_history if s['id'] == selected_session_id), None)
+            selected_session = history_by_id.get(selected_session_id)
             
             if selected_session:
                 # Load the full session from the database (the history might have limited data)
                 full_session = data_handler.load_session(selected_session['id'])
                 
+                data_handler.close_current_session()
                 if full_session:
                     # Use the full session data
                     st.session_state.current_session_data = full_session
@@ -554,7 +617,7 @@ elif app_mode == "Session History":
                 # Safely access processed_results with a default empty list
                 processed_results = st.session_state.current_session_data.get('processed_results', [])
                 st.session_state.processed_frames = processed_results
-                st.session_state.biomechanics_data = biomechanics.extract_time_series_data(processed_results)
+                st.session_state.biomechanics_data = cached_time_series(selected_session['id'], len(processed_results), st.session_state.current_session_data)
                 st.session_state.frame_index = 0
                 
                 # Navigate to analysis page
@@ -564,54 +627,46 @@ elif app_mode == "Session History":
         # Compare sessions
         st.subheader("Compare Sessions")
         
-        if len(st.session_state.session_history) >= 2:
+        if len(session_ids) >= 2:
             col1, col2 = st.columns(2)
             
             with col1:
                 session1_id = st.selectbox(
                     "First Session", 
-                    options=[session['id'] for session in st.session_state.session_history],
-                    format_func=lambda x: next((s['name'] for s in st.session_state.session_history if s['id'] == x), x),
+                    options=session_ids,
+                    format_func=history_names.get,
                     key="session1"
                 )
             
             with col2:
                 # Filter out session1 from the options
-                session2_options = [s['id'] for s in st.session_state.session_history if s['id'] != session1_id]
+                session2_options = [session_id for session_id in session_ids if session_id != session1_id]
                 session2_id = st.selectbox(
                     "Second Session", 
                     options=session2_options,
-                    format_func=lambda x: next((s['name'] for s in st.session_state.session_history if s['id'] == x), x),
+                    format_func=history_names.get,
                     key="session2"
                 )
             
             if st.button("Compare Sessions"):
                 # Get the selected sessions
-                session1 = next((s for s in st.session_state.session_history if s['id'] == session1_id), None)
-                session2 = next((s for s in st.session_state.session_history if s['id'] == session2_id), None)
+                session1 = history_by_id.get(session1_id)
+                session2 = history_by_id.get(session2_id)
                 
                 if session1 and session2:
-                    # Load full sessions from the database for better data
-                    full_session1 = data_handler.load_session(session1['id'])
-                    full_session2 = data_handler.load_session(session2['id'])
-                    
-                    # Use full sessions if available, otherwise use what we have from history
-                    session1_data = full_session1 if full_session1 else session1
-                    session2_data = full_session2 if full_session2 else session2
-                    
-                    # Ensure processed_results exists in both sessions
-                    if 'processed_results' not in session1_data:
-                        session1_data['processed_results'] = []
-                    if 'processed_results' not in session2_data:
-                        session2_data['processed_results'] = []
-                    
-                    # Extract time series data for both sessions
-                    biomechanics_data1 = biomechanics.extract_time_series_data(session1_data['processed_results'])
-                    biomechanics_data2 = biomechanics.extract_time_series_data(session2_data['processed_results'])
+                    # Load and analyse both sessions at the same time; the worker threads
+                    # share this script run's context so they can use session state and caches
+                    ctx = get_script_run_ctx()
+                    with ThreadPoolExecutor(max_workers=2, initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+                        future1 = executor.submit(load_comparison_data, session1)
+                        future2 = executor.submit(load_comparison_data, session2)
+                        loaded1, biomechanics_data1, metrics1 = future1.result()
+                        loaded2, biomechanics_data2, metrics2 = future2.result()
                     
-                    # Calculate performance metrics
-                    metrics1 = biomechanics.calculate_performance_metrics(biomechanics_data1, session1_data['processed_results'])
-                    metrics2 = biomechanics.calculate_performance_metrics(biomechanics_data2, session2_data['processed_results'])
+                    # Keep the loaded sessions in memory once both threads are done with them
+                    for loaded in (loaded1, loaded2):
+                        if loaded:
+                            data_handler.cache_session(loaded)
                     
                     # Display comparative visualization
                     st.subheader("Comparative Analysis")
@@ -1,7 +1,52 @@
 import numpy as np
 import pandas as pd
 import math
-from collections import defaultdict
+
+from utils import njit, prange, savgol_smooth
+
+# Number of landmarks in the MediaPipe pose model
+NUM_LANDMARKS = 33
+
+# Scalar biomechanical measurements recorded for every frame, in column order
+METRIC_KEYS = (
+    'arm_angle',
+    'wrist_angle',
+    'trunk_angle',
+    'front_knee_angle',
+    'back_knee_angle',
+    'shoulder_rotation',
+    'hip_shoulder_separation',
+    'release_point_height',
+    'release_point_horizontal'
+)
+NUM_METRICS = len(METRIC_KEYS)
+
+# Column of each measurement in METRIC_KEYS order, for the compiled kernels
+_ARM_ANGLE = METRIC_KEYS.index('arm_angle')
+_WRIST_ANGLE = METRIC_KEYS.index('wrist_angle')
+_TRUNK_ANGLE = METRIC_KEYS.index('trunk_angle')
+_FRONT_KNEE_ANGLE = METRIC_KEYS.index('front_knee_angle')
+_BACK_KNEE_ANGLE = METRIC_KEYS.index('back_knee_angle')
+_SHOULDER_ROTATION = METRIC_KEYS.index('shoulder_rotation')
+_HIP_SHOULDER_SEPARATION = METRIC_KEYS.index('hip_shoulder_separation')
+_RELEASE_POINT_HEIGHT = METRIC_KEYS.index('release_point_height')
+_RELEASE_POINT_HORIZONTAL = METRIC_KEYS.index('release_point_horizontal')
+
+# Joint angles measured from three landmarks (end, vertex, end), with the
+# METRIC_KEYS column each one is written to: arm (right shoulder-elbow-wrist),
+# front knee (left hip-knee-ankle) and back knee (right hip-knee-ankle)
+ANGLE_TRIPLETS = np.array([
+    [12, 14, 16, _ARM_ANGLE],
+    [23, 25, 27, _FRONT_KNEE_ANGLE],
+    [24, 26, 28, _BACK_KNEE_ANGLE]
+], dtype=np.int64)
+
+# Landmarks read by the measurements: both shoulders, the bowling (right) arm's
+# elbow and wrist, and both hips, knees and ankles
+KEY_LANDMARKS = np.array([11, 12, 14, 16, 23, 24, 25, 26, 27, 28], dtype=np.int64)
+
+# Landmarks only reported in extract_biomechanics' coordinates: the left elbow and wrist
+REPORTED_LANDMARKS = np.array([13, 15], dtype=np.int64)
 
 def calculate_angle(a, b, c):
     """
@@ -18,173 +63,299 @@ def calculate_angle(a, b, c):
     ang = math.degrees(math.atan2(c[1]-b[1], c[0]-b[0]) - math.atan2(a[1]-b[1], a[0]-b[0]))
     return ang + 360 if ang < 0 else ang
 
+@njit(cache=True, fastmath=True)
+def _fast_atan2(y, x):
+    """
+    Polynomial approximation of math.atan2, accurate to about 1e-4 degrees
+    
+    The arctangent of the octant-reduced ratio min/max comes from a degree 11
+    odd minimax polynomial and is then mapped back to the full circle. This
+    is far cheaper than the libm call and well below the error of the pose
+    estimates themselves.
+    """
+    abs_x = abs(x)
+    abs_y = abs(y)
+    high = max(abs_x, abs_y)
+    if high == 0.0:
+        return 0.0
+    z = min(abs_x, abs_y) / high
+    z2 = z * z
+    angle = z * (0.99997726 + z2 * (-0.33262347 + z2 * (0.19354346 + z2 * (
+        -0.11643287 + z2 * (0.05265332 + z2 * -0.01172120)))))
+    if abs_y > abs_x:
+        angle = math.pi / 2 - angle
+    if x < 0:
+        angle = math.pi - angle
+    return -angle if y < 0 else angle
+
+@njit(cache=True, fastmath=True)
+def _angle_between(ax, ay, bx, by, cx, cy):
+    """
+    Compiled equivalent of calculate_angle for scalar coordinates
+    """
+    # The difference lies in (-360, 360), so the modulo folds it into [0, 360) without a branch
+    return math.degrees(_fast_atan2(cy - by, cx - bx) - _fast_atan2(ay - by, ax - bx)) % 360.0
+
+@njit(cache=True, fastmath=True)
+def _to_pixels(landmarks, w, h, ids, pts):
+    """
+    Write the pixel coordinates of the given landmarks into pts, leaving
+    missing or low-visibility landmarks untouched
+    """
+    for k in range(ids.shape[0]):
+        i = ids[k]
+        if i < landmarks.shape[0] and landmarks[i, 3] >= 0.5:
+            pts[i, 0] = float(landmarks[i, 0]) * w
+            pts[i, 1] = float(landmarks[i, 1]) * h
+
+@njit(cache=True, fastmath=True)
+def _measure_frame(landmarks, w, h, pts, out):
+    """
+    Compute the scalar biomechanical measurements of a single frame in place
+    
+    Args:
+        landmarks: Array of shape (33, 4) holding normalized x, y, z and visibility
+        w: Frame width in pixels
+        h: Frame height in pixels
+        pts: (33, 2) array that receives the pixel coordinates of KEY_LANDMARKS
+        out: Array of length len(METRIC_KEYS) that receives the measurements
+    """
+    # Pixel coordinates, left at (0, 0) for missing or low-visibility landmarks
+    pts[:] = 0.0
+    _to_pixels(landmarks, w, h, KEY_LANDMARKS, pts)
+    
+    # Joint angles (arm and both knees) in one pass over the triplet table
+    for k in range(ANGLE_TRIPLETS.shape[0]):
+        a, b, c, column = ANGLE_TRIPLETS[k, 0], ANGLE_TRIPLETS[k, 1], ANGLE_TRIPLETS[k, 2], ANGLE_TRIPLETS[k, 3]
+        out[column] = _angle_between(pts[a, 0], pts[a, 1], pts[b, 0], pts[b, 1], pts[c, 0], pts[c, 1])
+    
+    # Wrist angle, approximated from the arm angle
+    arm_angle = float(out[_ARM_ANGLE])
+    out[_WRIST_ANGLE] = 180 - abs(arm_angle - 180)
+    
+    # Trunk angle (right shoulder-hip vertical alignment)
+    out[_TRUNK_ANGLE] = math.degrees(_fast_atan2(abs(pts[12, 0] - pts[24, 0]), abs(pts[12, 1] - pts[24, 1])))
+    
+    # Shoulder rotation and hip-shoulder separation
+    shoulder_rotation = math.degrees(_fast_atan2(pts[12, 1] - pts[11, 1], pts[12, 0] - pts[11, 0]))
+    hip_alignment = math.degrees(_fast_atan2(pts[24, 1] - pts[23, 1], pts[24, 0] - pts[23, 0]))
+    out[_SHOULDER_ROTATION] = shoulder_rotation
+    out[_HIP_SHOULDER_SEPARATION] = abs(shoulder_rotation - hip_alignment)
+    
+    # Release point from the right wrist position, normalized by frame size
+    out[_RELEASE_POINT_HEIGHT] = pts[16, 1] / h
+    out[_RELEASE_POINT_HORIZONTAL] = pts[16, 0] / w
+
+@njit(cache=True)
+def _compute_biomechanics(landmarks, w, h):
+    """
+    Compute the scalar biomechanical measurements of a single frame
+    
+    Args:
+        landmarks: Array of shape (33, 4) holding normalized x, y, z and visibility
+        w: Frame width in pixels
+        h: Frame height in pixels
+        
+    Returns:
+        tuple: (array of measurements in METRIC_KEYS order, (33, 2) array of pixel coordinates)
+    """
+    pts = np.empty((NUM_LANDMARKS, 2))
+    out = np.empty(NUM_METRICS)
+    _measure_frame(landmarks, w, h, pts, out)
+    _to_pixels(landmarks, w, h, REPORTED_LANDMARKS, pts)
+    return out, pts
+
+@njit(cache=True, parallel=True)
+def _compute_metrics(landmarks, w, h):
+    """
+    Compute the scalar biomechanical measurements of every frame
+    
+    Each frame's measurements are written straight into its row of the
+    output, so the landmarks are read once and nothing is copied per frame.
+    
+    Args:
+        landmarks: Array of shape (N, 33, 4), NaN for frames without a detected pose
+        w: Frame width in pixels
+        h: Frame height in pixels
+        
+    Returns:
+        numpy.ndarray: Array of shape (N, len(METRIC_KEYS)), NaN for frames without a pose
+    """
+    n = landmarks.shape[0]
+    metrics = np.full((n, NUM_METRICS), np.nan)
+    for i in prange(n):
+        if not np.isnan(landmarks[i, 0, 0]):
+            pts = np.empty((NUM_LANDMARKS, 2))
+            _measure_frame(landmarks[i], w, h, pts, metrics[i])
+    return metrics.astype(np.float32)
+
+def compute_metrics(landmarks, frame_shape):
+    """
+    Compute the scalar biomechanical measurements of a run of frames at once
+    
+    Args:
+        landmarks: Array of shape (N, 33, 4) as returned by stack_landmarks
+        frame_shape: Shape of the frames (height, width)
+        
+    Returns:
+        numpy.ndarray: Array of shape (N, len(METRIC_KEYS)), NaN for frames without a pose
+    """
+    h, w = frame_shape[:2]
+    landmarks = np.ascontiguousarray(landmarks, dtype=np.float32)
+    return _compute_metrics(landmarks, float(w), float(h))
+
 def extract_biomechanics(landmarks, frame_shape):
     """
     Extract biomechanical measurements from pose landmarks
     
     Args:
-        landmarks: MediaPipe pose landmarks
+        landmarks: MediaPipe pose landmarks, or an array from landmarks_to_array
         frame_shape: Shape of the frame (height, width)
         
     Returns:
         dict: Dictionary of biomechanical measurements
     """
     try:
+        # Frames without a detected pose are expected, so return quietly
         if landmarks is None:
-            print("No landmarks provided to extract_biomechanics")
             return None
         
         h, w = frame_shape[:2]
         
-        # Initialize landmark coordinates with safe defaults
-        landmark_coords = {}
-        
-        # Function to safely extract landmark coordinates
-        def get_landmark_safely(landmark_idx):
-            try:
-                if landmark_idx >= len(landmarks.landmark):
-                    print(f"Landmark index {landmark_idx} out of range")
-                    return (0, 0)
-                
-                landmark = landmarks.landmark[landmark_idx]
-                if not hasattr(landmark, 'visibility') or landmark.visibility < 0.5:
-                    print(f"Landmark {landmark_idx} has low visibility")
-                    return (0, 0)
-                
-                return (landmark.x * w, landmark.y * h)
-            except Exception as e:
-                print(f"Error extracting landmark {landmark_idx}: {str(e)}")
-                return (0, 0)
+        # Convert the landmarks to an array once and run the compiled kernel
+        if not isinstance(landmarks, np.ndarray):
+            landmarks = landmarks_to_array(landmarks)
+        values, pts = _compute_biomechanics(landmarks, float(w), float(h))
         
-        # Extract key landmark coordinates with safety checks
-        # Shoulder landmarks
-        left_shoulder = get_landmark_safely(11)
-        right_shoulder = get_landmark_safely(12)
+        biomechanics_data = {key: float(value) for key, value in zip(METRIC_KEYS, values)}
+        biomechanics_data['shoulder_coordinates'] = {
+            'left': (pts[11, 0], pts[11, 1]),
+            'right': (pts[12, 0], pts[12, 1])
+        }
+        biomechanics_data['elbow_coordinates'] = {
+            'left': (pts[13, 0], pts[13, 1]),
+            'right': (pts[14, 0], pts[14, 1])
+        }
+        biomechanics_data['wrist_coordinates'] = {
+            'left': (pts[15, 0], pts[15, 1]),
+            'right': (pts[16, 0], pts[16, 1])
+        }
+        return biomechanics_data
+    except Exception as e:
+        print(f"Error in extract_biomechanics: {str(e)}")
+        return None
+
+def landmarks_to_array(landmarks):
+    """
+    Convert MediaPipe pose landmarks to a numpy array
+    
+    Args:
+        landmarks: MediaPipe pose landmarks
         
-        # Elbow landmarks
-        left_elbow = get_landmark_safely(13)
-        right_elbow = get_landmark_safely(14)
+    Returns:
+        numpy.ndarray: Array of shape (33, 4) holding normalized x, y, z and visibility
+    """
+    return np.array(
+        [(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks.landmark],
+        dtype=np.float32
+    )
+
+def stack_landmarks(processed_results):
+    """
+    Stack the landmarks of every frame into a single array
+    
+    Args:
+        processed_results: List of processed frame results
         
-        # Wrist landmarks
-        left_wrist = get_landmark_safely(15)
-        right_wrist = get_landmark_safely(16)
+    Returns:
+        numpy.ndarray: Array of shape (N, 33, 4), NaN for frames without a detected pose
+    """
+    landmarks = np.full((len(processed_results), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    for i, result in enumerate(processed_results):
+        if result and result.get('landmarks') is not None:
+            landmarks[i] = result['landmarks']
+    return landmarks
+
+def metrics_to_array(processed_results):
+    """
+    Stack the scalar biomechanical measurements of every frame into a single array
+    
+    Args:
+        processed_results: List of processed frame results
         
-        # Hip landmarks
-        left_hip = get_landmark_safely(23)
-        right_hip = get_landmark_safely(24)
+    Returns:
+        numpy.ndarray: Array of shape (N, len(METRIC_KEYS)), NaN where a measurement is missing
+    """
+    metrics = np.full((len(processed_results), NUM_METRICS), np.nan, dtype=np.float32)
+    for i, result in enumerate(processed_results):
+        values = result.get('biomechanics') if result else None
+        if values:
+            metrics[i] = [values.get(key, np.nan) for key in METRIC_KEYS]
+    return metrics
+
+def results_from_arrays(landmarks, metrics, frame_paths=None):
+    """
+    Rebuild per-frame results from stacked landmark and measurement arrays
     
-        # Knee landmarks
-        left_knee = get_landmark_safely(25)
-        right_knee = get_landmark_safely(26)
+    Args:
+        landmarks (numpy.ndarray): Array of shape (N, 33, 4) as returned by stack_landmarks
+        metrics (numpy.ndarray): Array of shape (N, len(METRIC_KEYS)) as returned by metrics_to_array
+        frame_paths (list): Annotated frame path of each frame (None if not given)
+        
+    Returns:
+        list: List of processed frame results
+    """
+    if frame_paths is None:
+        frame_paths = [None] * len(landmarks)
     
-        # Ankle landmarks
-        left_ankle = get_landmark_safely(27)
-        right_ankle = get_landmark_safely(28)
+    has_pose = ~np.isnan(landmarks).all(axis=(1, 2)) if len(landmarks) else []
     
-        # Calculate biomechanical measurements
-        
-        # Arm angle (shoulder-elbow-wrist)
-        # For right-handed bowlers, use right arm
-        # For left-handed bowlers, would need to detect and use left arm
-        bowling_arm_angle = calculate_angle(right_shoulder, right_elbow, right_wrist)
-        
-        # Wrist angle (elbow-wrist-index finger)
-        # Approximating using the elbow-wrist vector and assuming wrist extension
-        wrist_angle = 180 - abs(bowling_arm_angle - 180)
-        
-        # Trunk angle (shoulder-hip vertical alignment)
-        # Vertical alignment of shoulders relative to hips
-        trunk_angle = np.rad2deg(np.arctan2(
-            abs(right_shoulder[0] - right_hip[0]),
-            abs(right_shoulder[1] - right_hip[1])
-        ))
-        
-        # Front knee angle (hip-knee-ankle)
-        front_knee_angle = calculate_angle(left_hip, left_knee, left_ankle)
-        
-        # Back knee angle
-        back_knee_angle = calculate_angle(right_hip, right_knee, right_ankle)
-        
-        # Shoulder rotation (estimated from shoulder alignment)
-        shoulder_rotation = np.rad2deg(np.arctan2(
-            right_shoulder[1] - left_shoulder[1],
-            right_shoulder[0] - left_shoulder[0]
-        ))
-        
-        # Hip-shoulder separation (difference in alignment between hips and shoulders)
-        hip_alignment = np.rad2deg(np.arctan2(
-            right_hip[1] - left_hip[1],
-            right_hip[0] - left_hip[0]
-        ))
-        hip_shoulder_separation = abs(shoulder_rotation - hip_alignment)
-        
-        # Release point - using wrist position
-        release_point_height = right_wrist[1] / h  # Normalized by frame height
-        release_point_horizontal = right_wrist[0] / w  # Normalized by frame width
-        
-        # Return all biomechanical measurements
-        return {
-            'arm_angle': bowling_arm_angle,
-            'wrist_angle': wrist_angle,
-            'trunk_angle': trunk_angle,
-            'front_knee_angle': front_knee_angle,
-            'back_knee_angle': back_knee_angle,
-            'shoulder_rotation': shoulder_rotation,
-            'hip_shoulder_separation': hip_shoulder_separation,
-            'release_point_height': release_point_height,
-            'release_point_horizontal': release_point_horizontal,
-            'shoulder_coordinates': {
-                'left': left_shoulder,
-                'right': right_shoulder
-            },
-            'elbow_coordinates': {
-                'left': left_elbow,
-                'right': right_elbow
-            },
-            'wrist_coordinates': {
-                'left': left_wrist,
-                'right': right_wrist
-            }
+    processed_results = []
+    for i, (frame_landmarks, frame_metrics, frame_path) in enumerate(zip(landmarks, metrics, frame_paths)):
+        values = {
+            key: float(value)
+            for key, value in zip(METRIC_KEYS, frame_metrics.tolist())
+            if not math.isnan(value)
         }
-    except Exception as e:
-        print(f"Error in extract_biomechanics: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        return None
+        processed_results.append({
+            'frame_path': frame_path,
+            'landmarks': frame_landmarks if has_pose[i] else None,
+            'biomechanics': values or None
+        })
+    return processed_results
 
-def extract_time_series_data(processed_results):
+def extract_time_series_data(metrics):
     """
     Extract time series data from processed frames
     
     Args:
-        processed_results: List of processed frame results
+        metrics: Array of per-frame measurements from metrics_to_array
         
     Returns:
         dict: Dictionary of time series data for each biomechanical measurement
     """
-    # Initialize time series data structure
-    time_series = defaultdict(list)
-    
-    # Extract biomechanical data from each frame
-    for result in processed_results:
-        if result['biomechanics']:
-            for key, value in result['biomechanics'].items():
-                # Only add scalar values to time series
-                if isinstance(value, (int, float)):
-                    time_series[key].append(value)
-    
-    # Convert to regular dictionary with numpy arrays
-    for key in time_series:
-        time_series[key] = np.array(time_series[key])
+    time_series = {}
+    
+    # Keep only the frames where each measurement is available, returning views
+    # of the array when nothing is missing
+    available = ~np.isnan(metrics)
+    for i, key in enumerate(METRIC_KEYS):
+        if available[:, i].all():
+            values = metrics[:, i]
+        else:
+            values = metrics[available[:, i], i]
+        if len(values) > 0:
+            time_series[key] = values
     
-    return dict(time_series)
+    return time_series
 
-def identify_bowling_phases(processed_results):
+def identify_bowling_phases(metrics):
     """
     Identify key phases in the bowling action
     
     Args:
-        processed_results: List of processed frame results
+        metrics: Array of per-frame measurements from metrics_to_array
+            (a list of processed frame results is converted first)
         
     Returns:
         dict: Dictionary of key phases and their frame indices
@@ -198,104 +369,81 @@ def identify_bowling_phases(processed_results):
         'Follow Through': None
     }
     
+    if not isinstance(metrics, np.ndarray):
+        metrics = metrics_to_array(metrics)
+    
     # Safety check for empty or invalid data
-    if not processed_results:
+    if len(metrics) == 0:
         print("No processed results provided to identify_bowling_phases")
         return phases
     
-    # Verify frames have biomechanics data
-    valid_frames = []
-    for i, result in enumerate(processed_results):
-        # Check that the structure includes biomechanics
-        if result and 'biomechanics' in result and result['biomechanics'] is not None:
-            valid_frames.append(i)
+    # Frames where both the arm and trunk angles were measured
+    arm_column = metrics[:, METRIC_KEYS.index('arm_angle')]
+    trunk_column = metrics[:, METRIC_KEYS.index('trunk_angle')]
+    frame_indices = np.flatnonzero(~np.isnan(arm_column) & ~np.isnan(trunk_column))
     
-    if not valid_frames:
+    if len(frame_indices) == 0:
         print("No valid frames with biomechanics data found")
         return phases
     
-    # Extract arm angles across frames
-    arm_angles = []
-    trunk_angles = []
-    
-    for i in valid_frames:
-        result = processed_results[i]
-        # Use get() with default to avoid KeyError
-        if result['biomechanics'] and 'arm_angle' in result['biomechanics'] and 'trunk_angle' in result['biomechanics']:
-            arm_angles.append((i, result['biomechanics']['arm_angle']))
-            trunk_angles.append((i, result['biomechanics']['trunk_angle']))
-    
-    if not arm_angles or not trunk_angles:
-        print("Could not extract arm or trunk angles from biomechanics data")
-        return phases
+    # Smooth out pose-estimation jitter so the picks below don't land on a single noisy frame
+    arm_angles = savgol_smooth(arm_column[frame_indices])
+    trunk_angles = savgol_smooth(trunk_column[frame_indices])
     
     # Find run-up phase - early frames with relatively consistent arm angle
     if len(arm_angles) > 5:
-        phases['Run-up'] = arm_angles[2][0]  # Use a frame near the beginning
-    
-    # Find loading phase - when trunk angle starts increasing
-    trunk_angle_changes = [abs(trunk_angles[i+1][1] - trunk_angles[i][1]) 
-                          for i in range(len(trunk_angles)-1)]
+        phases['Run-up'] = int(frame_indices[2])  # Use a frame near the beginning
     
-    if trunk_angle_changes:
-        max_trunk_change_idx = trunk_angle_changes.index(max(trunk_angle_changes, default=0))
+    if len(arm_angles) > 1:
+        # Find loading phase - when trunk angle starts increasing
+        max_trunk_change_idx = np.argmax(np.abs(np.diff(trunk_angles)))
         if max_trunk_change_idx > 0:
-            phases['Loading'] = trunk_angles[max_trunk_change_idx][0]
-    
-    # Find delivery stride - when arm angle starts decreasing rapidly
-    arm_angle_changes = [arm_angles[i+1][1] - arm_angles[i][1] 
-                        for i in range(len(arm_angles)-1)]
-    
-    if arm_angle_changes:
-        min_arm_change_idx = arm_angle_changes.index(min(arm_angle_changes, default=0))
+            phases['Loading'] = int(frame_indices[max_trunk_change_idx])
+        
+        # Find delivery stride - when arm angle starts decreasing rapidly
+        min_arm_change_idx = np.argmin(np.diff(arm_angles))
         if min_arm_change_idx > 0:
-            phases['Delivery Stride'] = arm_angles[min_arm_change_idx][0]
+            phases['Delivery Stride'] = int(frame_indices[min_arm_change_idx])
     
     # Find release point - when arm angle is approximately 180 degrees
-    release_candidates = [(i, abs(angle - 180)) for i, angle in arm_angles]
-    if release_candidates:
-        release_idx, _ = min(release_candidates, key=lambda x: x[1])
-        phases['Release'] = release_idx
+    release_idx = np.argmin(np.abs(arm_angles - 180))
+    phases['Release'] = int(frame_indices[release_idx])
     
     # Find follow through - a few frames after release
-    if phases['Release'] is not None:
-        release_idx_in_list = [i for i, (frame_idx, _) in enumerate(arm_angles) 
-                              if frame_idx == phases['Release']]
-        
-        if release_idx_in_list and release_idx_in_list[0] + 3 < len(arm_angles):
-            phases['Follow Through'] = arm_angles[release_idx_in_list[0] + 3][0]
+    if release_idx + 3 < len(arm_angles):
+        phases['Follow Through'] = int(frame_indices[release_idx + 3])
     
     return phases
 
-def calculate_performance_metrics(biomechanics_data, processed_results):
+def calculate_performance_metrics(biomechanics_data, frame_metrics, phases=None):
     """
     Calculate performance metrics from biomechanical data
     
     Args:
         biomechanics_data: Dictionary of time series biomechanical data
-        processed_results: List of processed frame results
+        frame_metrics: Array of per-frame measurements from metrics_to_array
+        phases: Bowling phases from identify_bowling_phases (detected if not given)
         
     Returns:
         dict: Dictionary of performance metrics
     """
-    if not biomechanics_data or not processed_results:
+    if not biomechanics_data or frame_metrics is None or len(frame_metrics) == 0:
         return None
     
     metrics = {}
     
     # Find release frame
-    phases = identify_bowling_phases(processed_results)
+    if phases is None:
+        phases = identify_bowling_phases(frame_metrics)
     release_frame = phases.get('Release')
     
     # Extract arm angle at release
-    if release_frame is not None and 0 <= release_frame < len(processed_results):
-        # Get biomechanics data safely
-        release_biomechanics = processed_results[release_frame].get('biomechanics', None)
-        if release_biomechanics:
-            # Get metrics using get with defaults to avoid KeyError
-            metrics['Arm Angle at Release'] = release_biomechanics.get('arm_angle', 0)
-            metrics['Wrist Angle at Release'] = release_biomechanics.get('wrist_angle', 0)
-            metrics['Release Height'] = release_biomechanics.get('release_point_height', 0) * 100  # As percentage of frame height
+    if release_frame is not None and 0 <= release_frame < len(frame_metrics):
+        release_values = dict(zip(METRIC_KEYS, np.nan_to_num(frame_metrics[release_frame])))
+        if not np.isnan(frame_metrics[release_frame]).all():
+            metrics['Arm Angle at Release'] = release_values['arm_angle']
+            metrics['Wrist Angle at Release'] = release_values['wrist_angle']
+            metrics['Release Height'] = release_values['release_point_height'] * 100  # As percentage of frame height
     
     # If we don't have release frame data, use the time series data
     if 'Arm Angle at Release' not in metrics and 'arm_angle' in biomechanics_data:
@@ -348,7 +496,8 @@ def calculate_performance_metrics(biomechanics_data, processed_results):
     if score_components:
         metrics['Technical Efficiency'] = np.mean(score_components)
     
-    return metrics
+    # Report plain floats so callers can format them regardless of the array dtype
+    return {key: float(value) for key, value in metrics.items()}
 
 def calculate_technical_score(metrics):
     """
@@ -458,3 +607,7 @@ def generate_suggestions(metrics):
         suggestions['General'] = "Your bowling technique looks good overall. Continue to practice for consistency and minor refinements."
     
     return suggestions
+
+# Compile the kernels at import so the first processed video doesn't pay for it
+_compute_biomechanics(np.zeros((NUM_LANDMARKS, 4), dtype=np.float32), 1.0, 1.0)
+_compute_metrics(np.zeros((1, NUM_LANDMARKS, 4), dtype=np.float32), 1.0, 1.0)
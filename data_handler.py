@@ -1,15 +1,32 @@
 import os
-import json
+import gc
 import datetime
 import shutil
 import tempfile
+import threading
+import numpy as np
 import pandas as pd
 import streamlit as st
+import biomechanics
 import database
+import utils
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
 
 # Define base directory for data storage
 DATA_DIR = "cricket_biomechanics_data"
 EXPORTS_DIR = f"{DATA_DIR}/exports"
+FRAMES_DIR = f"{DATA_DIR}/frames"
+VIDEO_INDEX_FILE = f"{DATA_DIR}/video_index.json"
+
+# Number of full sessions kept in memory; older ones are reloaded from the database
+MAX_CACHED_SESSIONS = 3
+
+# Serializes updates to the in-memory session cache, which can be made from worker threads
+_session_cache_lock = threading.Lock()
 
 def ensure_directories():
     """
@@ -17,6 +34,93 @@ def ensure_directories():
     """
     os.makedirs(DATA_DIR, exist_ok=True)
     os.makedirs(EXPORTS_DIR, exist_ok=True)
+    os.makedirs(FRAMES_DIR, exist_ok=True)
+
+def get_frames_dir(session_id):
+    """
+    Get the directory holding the annotated frames of a session
+    
+    Args:
+        session_id (str): ID of the session
+        
+    Returns:
+        str: Path to the frames directory
+    """
+    frames_dir = os.path.join(FRAMES_DIR, session_id)
+    os.makedirs(frames_dir, exist_ok=True)
+    return frames_dir
+
+def _load_video_index():
+    """
+    Load the mapping from video content hashes to session IDs
+    
+    Returns:
+        dict: Session ID for each video hash
+    """
+    try:
+        with open(VIDEO_INDEX_FILE, 'rb') as f:
+            return utils.json_loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_video_index(index):
+    """
+    Write the mapping from video content hashes to session IDs
+    
+    Args:
+        index (dict): Session ID for each video hash
+    """
+    ensure_directories()
+    tmp_path = f"{VIDEO_INDEX_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(utils.json_dumps(index))
+    os.replace(tmp_path, VIDEO_INDEX_FILE)
+
+def _attach_frame_paths(session_data):
+    """
+    Point each processed result at its annotated frame if it is still on disk
+    
+    Args:
+        session_data (dict): Session data loaded from the database
+    """
+    frames_dir = os.path.join(FRAMES_DIR, session_data['id'])
+    if not os.path.isdir(frames_dir):
+        return
+    
+    for i, result in enumerate(session_data.get('processed_results', [])):
+        frame_path = os.path.join(frames_dir, utils.frame_filename(i))
+        if os.path.exists(frame_path):
+            result['frame_path'] = frame_path
+
+def cache_session(session_data):
+    """
+    Keep a full session in memory, evicting the least recently used ones
+    
+    Safe to call from several threads at once; the update and eviction
+    happen under a lock.
+    
+    Args:
+        session_data (dict): Session data
+    """
+    with _session_cache_lock:
+        if 'saved_sessions' not in st.session_state:
+            st.session_state.saved_sessions = {}
+        cache = st.session_state.saved_sessions
+        
+        # Re-insert so the dict stays ordered from least to most recently used
+        cache.pop(session_data['id'], None)
+        cache[session_data['id']] = session_data
+        while len(cache) > MAX_CACHED_SESSIONS:
+            del cache[next(iter(cache))]
+
+def close_current_session():
+    """
+    Release the session currently open for analysis
+    """
+    st.session_state.current_session_data = None
+    st.session_state.processed_frames = []
+    st.session_state.biomechanics_data = None
+    gc.collect()
 
 def save_session(session_data):
     """
@@ -35,14 +139,48 @@ def save_session(session_data):
     
     if success:
         # Also keep in session state for immediate access
-        if 'saved_sessions' not in st.session_state:
-            st.session_state.saved_sessions = {}
+        cache_session(session_data)
         
-        # Store the full session data in session state
-        st.session_state.saved_sessions[session_data['id']] = session_data
+        # Remember which video the session came from so it isn't processed twice
+        if session_data.get('video_hash'):
+            index = _load_video_index()
+            index[session_data['video_hash']] = session_data['id']
+            _save_video_index(index)
+        
+        # Make the new session show up in the history
+        _load_session_history_from_db.clear()
     
     return success
 
+def session_summary(session_data):
+    """
+    Get the lightweight metadata of a session as listed in the history
+    
+    Args:
+        session_data (dict): Session data
+        
+    Returns:
+        dict: Session metadata
+    """
+    return {
+        'id': session_data['id'],
+        'name': session_data['name'],
+        'bowler': session_data['bowler'],
+        'type': session_data['type'],
+        'date': session_data['date'],
+        'fps': session_data['fps']
+    }
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_session_history_from_db():
+    """
+    Load metadata for all sessions stored in the database
+    
+    Returns:
+        list: List of session metadata
+    """
+    return database.load_sessions_from_db()
+
 def load_session_history():
     """
     Load metadata for all saved sessions
@@ -53,30 +191,81 @@ def load_session_history():
     ensure_directories()
     
     # First try loading from database
-    sessions = database.load_sessions_from_db()
+    sessions = _load_session_history_from_db()
     
     # If empty, check session state (might be during development)
     if not sessions and 'saved_sessions' in st.session_state:
-        sessions = list(st.session_state.saved_sessions.values())
+        sessions = [session_summary(session) for session in st.session_state.saved_sessions.values()]
     
     return sessions
 
-def load_session(session_id):
+def load_session(session_id, cache=True):
     """
     Load session data from database
     
     Args:
         session_id (str): ID of session to load
+        cache (bool): Whether to keep the loaded session in memory; pass False
+            from worker threads and call cache_session on the script thread
         
     Returns:
         dict: Session data
     """
-    # First check session state for faster access
-    if 'saved_sessions' in st.session_state and session_id in st.session_state.saved_sessions:
-        return st.session_state.saved_sessions.get(session_id)
+    # First check session state for faster access; a single get() so a concurrent
+    # eviction can't remove the entry between checking for it and reading it
+    session_data = st.session_state.get('saved_sessions', {}).get(session_id)
+    if session_data is not None:
+        if cache:
+            cache_session(session_data)
+        return session_data
     
     # If not in session state, load from database
-    return database.load_session_from_db(session_id)
+    session_data = database.load_session_from_db(session_id)
+    if session_data:
+        _attach_frame_paths(session_data)
+        
+        # Keep it so reloading or comparing the session doesn't query the database again
+        if cache:
+            cache_session(session_data)
+    return session_data
+
+def load_session_by_hash(video_hash):
+    """
+    Load the session previously created from the same video
+    
+    Args:
+        video_hash (str): Content hash of the video
+        
+    Returns:
+        dict: Session data or None if the video hasn't been processed
+    """
+    index = _load_video_index()
+    session_id = index.get(video_hash)
+    if session_id is None:
+        return None
+    
+    session_data = load_session(session_id)
+    if session_data is None:
+        # The session has gone, so forget about it
+        del index[video_hash]
+        _save_video_index(index)
+    return session_data
+
+def store_session_phases(session_data, phases):
+    """
+    Attach bowling phases to a session and persist them
+    
+    Used to migrate sessions saved before phases were detected at processing time.
+    
+    Args:
+        session_data (dict): Session data
+        phases (dict): Bowling phases from identify_bowling_phases
+        
+    Returns:
+        bool: Success status
+    """
+    session_data['phases'] = phases
+    return database.update_session_phases_in_db(session_data['id'], phases)
 
 def delete_session(session_id):
     """
@@ -92,8 +281,19 @@ def delete_session(session_id):
     if 'saved_sessions' in st.session_state and session_id in st.session_state.saved_sessions:
         del st.session_state.saved_sessions[session_id]
     
+    # Remove the annotated frames stored on disk
+    shutil.rmtree(os.path.join(FRAMES_DIR, session_id), ignore_errors=True)
+    
+    # Drop the session from the video index
+    index = _load_video_index()
+    remaining = {video_hash: sid for video_hash, sid in index.items() if sid != session_id}
+    if len(remaining) != len(index):
+        _save_video_index(remaining)
+    
     # Delete from database
-    return database.delete_session_from_db(session_id)
+    success = database.delete_session_from_db(session_id)
+    _load_session_history_from_db.clear()
+    return success
 
 def save_analysis_report(session_data):
     """
@@ -134,16 +334,80 @@ def save_analysis_report(session_data):
     else:
         return "Error saving report"
 
-def export_session_data(session_id, export_format='csv'):
+def _write_excel(df, file_path):
     """
-    Export session data to CSV or Excel
+    Write a numeric DataFrame to an Excel file
+    
+    The rows are streamed in order, with xlsxwriter in constant-memory mode or
+    otherwise an openpyxl write-only workbook, so the cell grid is never held
+    in memory. Missing values are left blank.
+    
+    Args:
+        df (pandas.DataFrame): DataFrame with numeric columns
+        file_path (str): Path of the .xlsx file
+    """
+    header = [str(column) for column in df.columns]
+    rows = df.to_numpy(dtype=np.float64)
+    
+    if xlsxwriter is None:
+        import openpyxl
+        workbook = openpyxl.Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+        worksheet.append(header)
+        for values in rows:
+            worksheet.append([value if value == value else None for value in values.tolist()])
+        workbook.save(file_path)
+        return
+    
+    with xlsxwriter.Workbook(file_path, {'constant_memory': True}) as workbook:
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, header)
+        for row, values in enumerate(rows, start=1):
+            for col, value in enumerate(values.tolist()):
+                if value == value:  # skip NaN
+                    worksheet.write_number(row, col, value)
+
+def _export_dataframe(session_data):
+    """
+    Build the per-frame measurements table of a session for export
+    
+    The DataFrame is built straight from the columns of the measurements
+    array, keeping the frames that have any measurement.
+    
+    Args:
+        session_data (dict): Session data
+        
+    Returns:
+        pandas.DataFrame: Frame index, timestamp and measured columns
+    """
+    metrics = session_data.get('metrics')
+    if metrics is None:
+        metrics = biomechanics.metrics_to_array(session_data['processed_results'])
+    frames = np.flatnonzero(~np.isnan(metrics).all(axis=1))
+    measured = metrics[frames]
+    
+    columns = {
+        'frame': frames,
+        'timestamp': frames / session_data['fps']
+    }
+    for i, key in enumerate(biomechanics.METRIC_KEYS):
+        if not np.isnan(measured[:, i]).all():
+            columns[key] = measured[:, i]
+    
+    return pd.DataFrame(columns, copy=False)
+
+def export_session_formats(session_id, export_formats=('csv', 'excel')):
+    """
+    Export session data to several formats at once
+    
+    The table is built once and written in each format.
     
     Args:
         session_id (str): ID of session to export
-        export_format (str): Format to export (csv or excel)
+        export_formats (tuple): Formats to export (csv and/or excel)
         
     Returns:
-        tuple: (success, file_path or error message)
+        tuple: (success, dict of file path per format or error message)
     """
     # Load the session
     session_data = load_session(session_id)
@@ -152,39 +416,39 @@ def export_session_data(session_id, export_format='csv'):
     
     try:
         ensure_directories()
-        
-        # Extract biomechanics data from all frames
-        biomechanics_data = []
-        
-        for i, result in enumerate(session_data['processed_results']):
-            if result['biomechanics']:
-                frame_data = {
-                    'frame': i,
-                    'timestamp': i / session_data['fps']
-                }
-                
-                # Add biomechanics metrics
-                for key, value in result['biomechanics'].items():
-                    if isinstance(value, (int, float)):
-                        frame_data[key] = value
-                
-                biomechanics_data.append(frame_data)
-        
-        # Create a DataFrame
-        df = pd.DataFrame(biomechanics_data)
+        df = _export_dataframe(session_data)
         
         # Create export file path
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         file_name = f"{session_data['id']}_{timestamp}_export"
         
-        if export_format == 'csv':
-            file_path = os.path.join(EXPORTS_DIR, f"{file_name}.csv")
-            df.to_csv(file_path, index=False)
-        else:  # excel
-            file_path = os.path.join(EXPORTS_DIR, f"{file_name}.xlsx")
-            df.to_excel(file_path, index=False)
+        file_paths = {}
+        for export_format in export_formats:
+            if export_format == 'csv':
+                file_path = os.path.join(EXPORTS_DIR, f"{file_name}.csv")
+                df.to_csv(file_path, index=False)
+            else:  # excel
+                file_path = os.path.join(EXPORTS_DIR, f"{file_name}.xlsx")
+                _write_excel(df, file_path)
+            file_paths[export_format] = file_path
         
-        return True, file_path
+        return True, file_paths
         
     except Exception as e:
         return False, str(e)
+
+def export_session_data(session_id, export_format='csv'):
+    """
+    Export session data to CSV or Excel
+    
+    Args:
+        session_id (str): ID of session to export
+        export_format (str): Format to export (csv or excel)
+        
+    Returns:
+        tuple: (success, file_path or error message)
+    """
+    success, result = export_session_formats(session_id, (export_format,))
+    if success:
+        return True, result[export_format]
+    return False, result
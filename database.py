@@ -1,21 +1,34 @@
 import os
-import json
 import datetime
+import io
 import base64
 import pickle
+import numpy as np
 from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+import biomechanics
+import utils
 
 # Get database URL from environment variable
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
-# Create SQLAlchemy engine and session
-engine = create_engine(DATABASE_URL, poolclass=NullPool)
+# Create SQLAlchemy engine and session. Connections are pooled so a query
+# doesn't pay for a new connection handshake; pre-ping replaces connections
+# the server has dropped, and recycling retires them before idle timeouts
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=5,
+    max_overflow=10,
+    pool_recycle=1800,
+    pool_pre_ping=True
+)
 Session = sessionmaker(bind=engine)
 Base = declarative_base()
 
+# Whether the tables have been created in this process
+_tables_created = False
+
 class BowlingSession(Base):
     """SQLAlchemy model for cricket bowling sessions"""
     __tablename__ = 'bowling_sessions'
@@ -34,18 +47,6 @@ class BowlingSession(Base):
     def to_dict(self):
         """Convert model to dictionary"""
         try:
-            # Load simplified biomechanics data safely
-            biomechanics_data = []
-            if self.processed_results_data:
-                try:
-                    biomechanics_data = pickle.loads(self.processed_results_data)
-                except Exception as e:
-                    print(f"Error deserializing biomechanics data: {str(e)}")
-                    biomechanics_data = []
-            
-            # Build the dictionary with placeholder for processed_results
-            # We'll only include the biomechanics data (no frames or landmarks)
-            # This avoids serialization issues with complex numpy arrays
             session_dict = {
                 'id': self.id,
                 'name': self.name,
@@ -53,16 +54,23 @@ class BowlingSession(Base):
                 'type': self.type,
                 'date': self.date.strftime('%Y-%m-%d %H:%M:%S') if self.date else None,
                 'fps': self.fps,
-                'processed_results': []  # Empty list will be filled with placeholder objects
+                'processed_results': []
             }
             
-            # Create minimal processed_results entries with just the biomechanics data
-            for i, data in enumerate(biomechanics_data):
-                session_dict['processed_results'].append({
-                    'frame': None,  # No frame data
-                    'landmarks': None,  # No landmarks
-                    'biomechanics': data.get('biomechanics', None)
-                })
+            # Bowling phases detected when the session was processed
+            if self.session_metadata:
+                phases = utils.json_loads(self.session_metadata).get('phases')
+                if phases:
+                    session_dict['phases'] = phases
+            
+            if self.processed_results_data:
+                try:
+                    landmarks, metrics = unpack_results(self.processed_results_data)
+                    session_dict['landmarks'] = landmarks
+                    session_dict['metrics'] = metrics
+                    session_dict['processed_results'] = biomechanics.results_from_arrays(landmarks, metrics)
+                except Exception as e:
+                    print(f"Error deserializing biomechanics data: {str(e)}")
             
             return session_dict
         except Exception as e:
@@ -93,12 +101,88 @@ class AnalysisReport(Base):
             'id': self.id,
             'session_id': self.session_id,
             'report_date': self.report_date.strftime('%Y-%m-%d %H:%M:%S') if self.report_date else None,
-            'report_data': json.loads(self.report_data) if self.report_data else {}
+            'report_data': utils.json_loads(self.report_data) if self.report_data else {}
         }
 
+# Landmarks are stored as int16 fixed point with this many steps per unit of
+# normalized coordinate, which keeps 4 decimal places
+LANDMARK_SCALE = 10000
+# Fixed point value standing in for NaN (frames without a detected pose)
+LANDMARK_MISSING = np.iinfo(np.int16).min
+
+def pack_results(landmarks, metrics):
+    """
+    Serialize per-frame landmarks and measurements for storage
+    
+    Landmarks are stored as int16 fixed point, and both arrays are deflate
+    compressed.
+    
+    Args:
+        landmarks (numpy.ndarray): Array of shape (N, 33, 4)
+        metrics (numpy.ndarray): Array of shape (N, len(METRIC_KEYS))
+        
+    Returns:
+        bytes: Serialized arrays
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    missing = np.isnan(landmarks)
+    fixed_point = np.clip(
+        np.rint(np.where(missing, 0, landmarks) * LANDMARK_SCALE), LANDMARK_MISSING + 1, np.iinfo(np.int16).max
+    ).astype(np.int16)
+    fixed_point[missing] = LANDMARK_MISSING
+    
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        landmarks=fixed_point,
+        metrics=np.asarray(metrics, dtype=np.float32),
+        metric_keys=np.array(biomechanics.METRIC_KEYS)
+    )
+    return buffer.getvalue()
+
+def unpack_results(data):
+    """
+    Deserialize per-frame landmarks and measurements written by pack_results
+    
+    Rows written before the arrays were stored hold a pickled list of
+    biomechanics dicts; those are converted with no landmarks.
+    
+    Args:
+        data (bytes): Serialized arrays
+        
+    Returns:
+        tuple: (landmarks array of shape (N, 33, 4), metrics array of shape (N, len(METRIC_KEYS)))
+    """
+    if not data.startswith(b'PK'):
+        results = pickle.loads(data)
+        landmarks = np.full((len(results), biomechanics.NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        return landmarks, biomechanics.metrics_to_array(results)
+    
+    with np.load(io.BytesIO(data)) as arrays:
+        landmarks = arrays['landmarks']
+        if landmarks.dtype == np.int16:
+            missing = landmarks == LANDMARK_MISSING
+            landmarks = landmarks.astype(np.float32) / LANDMARK_SCALE
+            landmarks[missing] = np.nan
+        else:
+            landmarks = landmarks.astype(np.float32)
+        stored = arrays['metrics']
+        stored_keys = list(arrays['metric_keys'])
+    
+    # Line the stored columns up with the current metric keys
+    metrics = np.full((len(stored), len(biomechanics.METRIC_KEYS)), np.nan, dtype=np.float32)
+    for i, key in enumerate(biomechanics.METRIC_KEYS):
+        if key in stored_keys:
+            metrics[:, i] = stored[:, stored_keys.index(key)]
+    return landmarks, metrics
+
 def initialize_database():
-    """Initialize database tables if they don't exist"""
+    """Initialize database tables if they don't exist, once per process"""
+    global _tables_created
+    if _tables_created:
+        return
     Base.metadata.create_all(engine)
+    _tables_created = True
     print("Database tables created successfully")
 
 def save_session_to_db(session_data):
@@ -111,14 +195,10 @@ def save_session_to_db(session_data):
     Returns:
         bool: Success status
     """
-    db_session = None
     try:
         # Initialize database
         initialize_database()
         
-        # Create a database session
-        db_session = Session()
-        
         # Create a copy of session data without large frame data for metadata
         session_metadata = {
             'id': session_data['id'],
@@ -126,28 +206,18 @@ def save_session_to_db(session_data):
             'bowler': session_data['bowler'],
             'type': session_data['type'],
             'date': session_data['date'],
-            'fps': session_data['fps']
+            'fps': session_data['fps'],
+            'phases': session_data.get('phases')
         }
         
-        # Process the processed_results to make them more serializable
-        # Store only the biomechanics data, not the frames (which are large numpy arrays)
-        simplified_results = []
-        for result in session_data['processed_results']:
-            # Only keep the biomechanics data, which should be more easily serializable
-            result_copy = {
-                'biomechanics': result.get('biomechanics', None)
-                # Skip frame and landmarks as they aren't easily serializable
-            }
-            simplified_results.append(result_copy)
-        
-        # Serialize simplified results
-        try:
-            processed_results_binary = pickle.dumps(simplified_results)
-        except Exception as pickle_error:
-            print(f"Error serializing simplified results: {str(pickle_error)}")
-            # Fallback to an even more minimal representation with just basic data
-            minimal_results = [{'biomechanics': result.get('biomechanics', {})} for result in simplified_results]
-            processed_results_binary = pickle.dumps(minimal_results)
+        # Store only the landmark and measurement arrays, not the annotated frames
+        landmarks = session_data.get('landmarks')
+        if landmarks is None:
+            landmarks = biomechanics.stack_landmarks(session_data['processed_results'])
+        metrics = session_data.get('metrics')
+        if metrics is None:
+            metrics = biomechanics.metrics_to_array(session_data['processed_results'])
+        processed_results_binary = pack_results(landmarks, metrics)
         
         # Parse the date
         if isinstance(session_data['date'], str):
@@ -167,13 +237,14 @@ def save_session_to_db(session_data):
             type=session_data['type'],
             date=date_obj,
             fps=session_data['fps'],
-            session_metadata=json.dumps(session_metadata),
+            session_metadata=utils.json_dumps(session_metadata),
             processed_results_data=processed_results_binary
         )
         
-        # Add to database and commit
-        db_session.add(new_session)
-        db_session.commit()
+        # Add to database and commit; the database session is closed on exit
+        with Session() as db_session:
+            db_session.add(new_session)
+            db_session.commit()
         
         print(f"Session {session_data['id']} saved successfully to database")
         return True
@@ -183,11 +254,6 @@ def save_session_to_db(session_data):
         import traceback
         print(traceback.format_exc())
         return False
-        
-    finally:
-        # Close the session if it was created
-        if db_session:
-            db_session.close()
 
 def load_sessions_from_db():
     """
@@ -200,11 +266,17 @@ def load_sessions_from_db():
         # Initialize database
         initialize_database()
         
-        # Create a database session
-        db_session = Session()
-        
-        # Query all bowling sessions
-        sessions = db_session.query(BowlingSession).all()
+        # Query only the metadata columns so the per-frame data of every session isn't read,
+        # oldest first so newly saved sessions append to the end of the history
+        with Session() as db_session:
+            sessions = db_session.query(
+                BowlingSession.id,
+                BowlingSession.name,
+                BowlingSession.bowler,
+                BowlingSession.type,
+                BowlingSession.date,
+                BowlingSession.fps
+            ).order_by(BowlingSession.date, BowlingSession.id).all()
         
         # Convert to dictionaries
         session_dicts = [
@@ -219,8 +291,6 @@ def load_sessions_from_db():
             for session in sessions
         ]
         
-        db_session.close()
-        
         return session_dicts
     except Exception as e:
         print(f"Error loading sessions from database: {str(e)}")
@@ -240,25 +310,50 @@ def load_session_from_db(session_id):
         # Initialize database
         initialize_database()
         
-        # Create a database session
-        db_session = Session()
-        
-        # Query the specific bowling session
-        session = db_session.query(BowlingSession).filter_by(id=session_id).first()
-        
-        if not session:
-            db_session.close()
-            return None
+        with Session() as db_session:
+            # Query the specific bowling session
+            session = db_session.query(BowlingSession).filter_by(id=session_id).first()
+            
+            if not session:
+                return None
+            
+            # Convert to dictionary
+            return session.to_dict()
+    except Exception as e:
+        print(f"Error loading session from database: {str(e)}")
+        return None
+
+def update_session_phases_in_db(session_id, phases):
+    """
+    Store the bowling phases of a session saved before phases were recorded
+    
+    Args:
+        session_id (str): ID of the session
+        phases (dict): Bowling phases from identify_bowling_phases
         
-        # Convert to dictionary
-        session_dict = session.to_dict()
+    Returns:
+        bool: Success status
+    """
+    try:
+        # Initialize database
+        initialize_database()
         
-        db_session.close()
+        with Session() as db_session:
+            # Query the specific bowling session
+            session = db_session.query(BowlingSession).filter_by(id=session_id).first()
+            if not session:
+                return False
+            
+            # Add the phases to the session's metadata
+            session_metadata = utils.json_loads(session.session_metadata) if session.session_metadata else {}
+            session_metadata['phases'] = phases
+            session.session_metadata = utils.json_dumps(session_metadata)
+            db_session.commit()
         
-        return session_dict
+        return True
     except Exception as e:
-        print(f"Error loading session from database: {str(e)}")
-        return None
+        print(f"Error updating session phases in database: {str(e)}")
+        return False
 
 def delete_session_from_db(session_id):
     """
@@ -274,20 +369,16 @@ def delete_session_from_db(session_id):
         # Initialize database
         initialize_database()
         
-        # Create a database session
-        db_session = Session()
-        
-        # Query the specific bowling session
-        session = db_session.query(BowlingSession).filter_by(id=session_id).first()
-        
-        if not session:
-            db_session.close()
-            return False
-        
-        # Delete the session
-        db_session.delete(session)
-        db_session.commit()
-        db_session.close()
+        with Session() as db_session:
+            # Query the specific bowling session
+            session = db_session.query(BowlingSession).filter_by(id=session_id).first()
+            
+            if not session:
+                return False
+            
+            # Delete the session
+            db_session.delete(session)
+            db_session.commit()
         
         return True
     except Exception as e:
@@ -309,23 +400,19 @@ def save_report_to_db(session_id, report_data):
         # Initialize database
         initialize_database()
         
-        # Create a database session
-        db_session = Session()
-        
         # Create a new report record
         new_report = AnalysisReport(
             session_id=session_id,
-            report_data=json.dumps(report_data)
+            report_data=utils.json_dumps(report_data)
         )
         
-        # Add to database and commit
-        db_session.add(new_report)
-        db_session.commit()
-        
-        # Get the ID
-        report_id = new_report.id
-        
-        db_session.close()
+        with Session() as db_session:
+            # Add to database and commit
+            db_session.add(new_report)
+            db_session.commit()
+            
+            # Get the ID
+            report_id = new_report.id
         
         return report_id
     except Exception as e:
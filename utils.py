@@ -1,18 +1,195 @@
 import uuid
 import os
+import gc
+import json
+import re
+import hashlib
 import time
+import contextlib
+import tempfile
+from collections import deque
 import numpy as np
 import cv2
 from datetime import datetime
 
+try:
+    from numba import njit, prange
+except ImportError:
+    prange = range
+    
+    def njit(*args, **kwargs):
+        """
+        Stand-in for numba.njit when Numba is not installed
+        
+        Returns the decorated function unchanged so it runs as plain Python.
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def generate_id():
     """
     Generate a unique ID for a session
     
     Returns:
-        str: Unique ID
+        str: Unique ID (32 hex characters)
+    """
+    return uuid.uuid4().hex
+
+@contextlib.contextmanager
+def gc_disabled():
+    """
+    Temporarily disable the cyclic garbage collector
+    
+    Useful around loops that allocate many short-lived objects without
+    creating reference cycles.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+class FrameBufferPool:
+    """
+    Pool of reusable image buffers
+    
+    Handing the same few arrays out again for every frame avoids allocating a
+    new image per frame, which the allocator doesn't always give back to the OS.
+    """
+    
+    def __init__(self, max_buffers=4):
+        """
+        Args:
+            max_buffers (int): Maximum number of free buffers kept per shape
+        """
+        self.max_buffers = max_buffers
+        self._free = {}
+    
+    def acquire(self, shape, dtype=np.uint8):
+        """
+        Get a buffer, reusing a released one of the same shape if available
+        
+        Args:
+            shape (tuple): Shape of the buffer
+            dtype: NumPy dtype of the buffer
+            
+        Returns:
+            numpy.ndarray: Uninitialised buffer
+        """
+        key = (tuple(shape), np.dtype(dtype))
+        try:
+            return self._free[key].pop()
+        except (KeyError, IndexError):
+            return np.empty(shape, dtype=dtype)
+    
+    def release(self, buffer):
+        """
+        Return a buffer to the pool once it is no longer in use
+        
+        Args:
+            buffer (numpy.ndarray): Buffer obtained from acquire
+        """
+        key = (buffer.shape, buffer.dtype)
+        free = self._free.setdefault(key, deque())
+        if len(free) < self.max_buffers:
+            free.append(buffer)
+
+def content_hash(data):
+    """
+    Compute a short hash identifying some content
+    
+    Args:
+        data: Bytes-like object to hash
+        
+    Returns:
+        str: Hex digest
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def write_temp_file(data, suffix='', chunk_size=16 * 1024 * 1024):
+    """
+    Write a bytes-like object to a new temporary file
+    
+    The data is written straight from its buffer in large slices with no
+    intermediate copy, so a large upload isn't duplicated in memory.
+    
+    Args:
+        data: Bytes-like object to write
+        suffix (str): File name suffix, e.g. the video's extension
+        chunk_size (int): Number of bytes handed to each write call
+        
+    Returns:
+        str: Path of the temporary file, which the caller must delete
+    """
+    view = memoryview(data).cast('B')
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False, buffering=0) as f:
+        for start in range(0, len(view), chunk_size):
+            chunk = view[start:start + chunk_size]
+            # Unbuffered writes may be partial
+            while chunk:
+                chunk = chunk[f.write(chunk):]
+    return f.name
+
+def _json_default(obj):
+    """
+    Convert NumPy values and datetimes the stdlib json module can't serialize,
+    matching orjson's output for them
+    """
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def json_dumps(obj):
+    """
+    Serialize an object to a JSON string, using orjson when it is installed
+    
+    Args:
+        obj: Object to serialize, which may contain NumPy arrays and scalars and datetimes
+        
+    Returns:
+        str: JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+    return json.dumps(obj, default=_json_default)
+
+def json_loads(data):
+    """
+    Parse a JSON document, using orjson when it is installed
+    
+    Args:
+        data (str or bytes): JSON document
+        
+    Returns:
+        object: Parsed value
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def frame_filename(frame_index):
+    """
+    Get the file name an annotated frame is stored under
+    
+    Args:
+        frame_index (int): Index of the frame
+        
+    Returns:
+        str: File name
     """
-    return str(uuid.uuid4())
+    return f"{frame_index:05d}.jpg"
 
 def timestamp_string():
     """
@@ -23,6 +200,12 @@ def timestamp_string():
     """
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
+# Characters filename_safe_string replaces: a translation table covering ASCII and,
+# for other strings, an equivalent pattern (\W matches exactly the characters
+# that aren't alphanumeric, apart from the underscore, which maps to itself)
+_UNSAFE_ASCII = str.maketrans({chr(i): "_" for i in range(128) if not chr(i).isalnum()})
+_UNSAFE_PATTERN = re.compile(r"\W")
+
 def filename_safe_string(s):
     """
     Convert a string to be safe for filenames
@@ -33,8 +216,10 @@ def filename_safe_string(s):
     Returns:
         str: Filename-safe string
     """
-    # Replace spaces with underscores and remove special characters
-    return "".join([c if c.isalnum() else "_" for c in s])
+    # Replace spaces and special characters with underscores
+    if s.isascii():
+        return s.translate(_UNSAFE_ASCII)
+    return _UNSAFE_PATTERN.sub("_", s)
 
 def resize_with_aspect_ratio(image, width=None, height=None, inter=cv2.INTER_AREA):
     """
@@ -78,64 +263,151 @@ def smooth_time_series(data, window_size=5):
     if len(data) < window_size:
         return data
     
-    # Create the window
-    window = np.ones(window_size) / window_size
+    # Window sums from a running sum, in a single pass over the data
+    smoothed = np.array(data, dtype=np.float64)
+    running_sum = np.concatenate(([0.0], np.cumsum(smoothed)))
     
-    # Apply convolution
-    smoothed = np.convolve(data, window, mode='valid')
+    # Keep the unsmoothed values at the ends to maintain the same length
+    pad_left = (window_size - 1) // 2
+    smoothed[pad_left:pad_left + len(data) - window_size + 1] = (
+        running_sum[window_size:] - running_sum[:-window_size]
+    ) / window_size
+    
+    return smoothed
+
+def savgol_smooth(data, window_size=9, polyorder=3):
+    """
+    Apply Savitzky-Golay smoothing to time series data
     
-    # Pad the ends to maintain the same length
-    pad_size = len(data) - len(smoothed)
-    pad_left = pad_size // 2
-    pad_right = pad_size - pad_left
+    A polynomial is least-squares fitted over a sliding window, which removes
+    frame-to-frame jitter while keeping the shape of peaks better than a
+    moving average. The first and last few samples are taken from the fit of
+    the first and last window.
     
-    return np.concatenate([data[:pad_left], smoothed, data[-pad_right:]])
+    Args:
+        data (numpy.ndarray): Input time series data
+        window_size (int): Size of smoothing window (odd)
+        polyorder (int): Order of the fitted polynomial, less than window_size
+        
+    Returns:
+        numpy.ndarray: Smoothed time series
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if len(data) < window_size:
+        return data
+    
+    # Least-squares fitting matrix of the window, centered on its middle sample
+    half = window_size // 2
+    vander = np.vander(np.arange(-half, half + 1), polyorder + 1, increasing=True)
+    fit = np.linalg.pinv(vander)
+    
+    smoothed = np.empty_like(data)
+    smoothed[half:len(data) - half] = np.correlate(data, fit[0], mode='valid')
+    smoothed[:half] = vander[:half] @ (fit @ data[:window_size])
+    smoothed[len(data) - half:] = vander[half + 1:] @ (fit @ data[-window_size:])
+    return smoothed
+
+def downsample_lttb(x, y, max_points=2000):
+    """
+    Downsample a time series for plotting with Largest-Triangle-Three-Buckets
+    
+    The first and last points are kept, and the points in between are split
+    into buckets. From each bucket the point forming the largest triangle with
+    the previously kept point and the next bucket's average is kept, so peaks
+    survive that plain decimation would drop.
+    
+    Args:
+        x (numpy.ndarray): Sample positions, increasing
+        y (numpy.ndarray): Sample values, may contain NaN
+        max_points (int): Maximum number of points to keep (at least 3)
+        
+    Returns:
+        tuple: (x array, y array) with at most max_points samples
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return x, y
+    
+    # Bucket boundaries for the points between the first and last
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    edges[-1] = n - 1
+    
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        
+        # Twice the triangle area; NaN areas lose unless the whole bucket is NaN
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        areas[np.isnan(areas)] = -1.0
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    
+    return x[selected], y[selected]
 
 def angle_between_points(a, b, c):
     """
     Calculate angle between three points
     
+    Each point can also be an array of shape (N, 2), in which case the N
+    angles are computed at once.
+    
     Args:
         a (tuple): First point (x, y)
         b (tuple): Middle point (x, y) - the vertex
         c (tuple): Third point (x, y)
         
     Returns:
-        float: Angle in degrees
+        float or numpy.ndarray: Angle in degrees
     """
-    vec_ba = (a[0] - b[0], a[1] - b[1])
-    vec_bc = (c[0] - b[0], c[1] - b[1])
-    
-    # Calculate dot product
-    dot_product = vec_ba[0] * vec_bc[0] + vec_ba[1] * vec_bc[1]
+    a = np.asarray(a, dtype=np.float64)[..., :2]
+    b = np.asarray(b, dtype=np.float64)[..., :2]
+    c = np.asarray(c, dtype=np.float64)[..., :2]
+    vec_ba = a - b
+    vec_bc = c - b
     
-    # Calculate magnitudes
-    mag_ba = np.sqrt(vec_ba[0]**2 + vec_ba[1]**2)
-    mag_bc = np.sqrt(vec_bc[0]**2 + vec_bc[1]**2)
+    # Calculate dot product and magnitudes
+    dot_product = np.sum(vec_ba * vec_bc, axis=-1)
+    magnitudes = np.hypot(vec_ba[..., 0], vec_ba[..., 1]) * np.hypot(vec_bc[..., 0], vec_bc[..., 1])
     
-    # Calculate angle
-    cos_angle = dot_product / (mag_ba * mag_bc)
+    # Calculate angle, treating zero-length vectors as 0 degrees
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_angle = dot_product / magnitudes
+    cos_angle = np.where(np.isnan(cos_angle), 1.0, cos_angle)
     
     # Handle numerical errors
-    cos_angle = max(-1, min(1, cos_angle))
+    cos_angle = np.clip(cos_angle, -1, 1)
     
     # Convert to degrees
-    angle = np.degrees(np.arccos(cos_angle))
-    
-    return angle
+    return np.degrees(np.arccos(cos_angle))
 
 def distance_between_points(a, b):
     """
     Calculate Euclidean distance between two points
     
+    Each point can also be an array of shape (N, 2), in which case the N
+    distances are computed at once.
+    
     Args:
         a (tuple): First point (x, y)
         b (tuple): Second point (x, y)
         
     Returns:
-        float: Distance
+        float or numpy.ndarray: Distance
     """
-    return np.sqrt((b[0] - a[0])**2 + (b[1] - a[1])**2)
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return np.hypot(b[..., 0] - a[..., 0], b[..., 1] - a[..., 1])
 
 def normalize_values(values, min_val=None, max_val=None):
     """
@@ -1,8 +1,24 @@
 import os
+import multiprocessing
+import itertools
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 import cv2
 import numpy as np
 import mediapipe as mp
 import streamlit as st
+from mediapipe.framework.formats import landmark_pb2
+from mediapipe.tasks import python as mp_tasks
+from mediapipe.tasks.python import vision as mp_vision
+
+import biomechanics
+import utils
+
+try:
+    import av
+except ImportError:
+    av = None
 
 
 # Set a writable model directory
@@ -17,102 +33,400 @@ mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
 mp_drawing_styles = mp.solutions.drawing_styles
 
-# Pose model for processing
-pose = mp_pose.Pose(
-    static_image_mode=False,
-    model_complexity=2,
-    enable_segmentation=True,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+# Pose skeleton as (start, end) landmark index pairs, and the default MediaPipe
+# drawing style of its connections and of each landmark
+_POSE_CONNECTIONS = np.array(sorted(mp_pose.POSE_CONNECTIONS), dtype=np.int64)
+_CONNECTION_STYLE = mp_drawing.DrawingSpec()
+_LANDMARK_STYLES = [
+    mp_drawing_styles.get_default_pose_landmarks_style()[idx]
+    for idx in range(biomechanics.NUM_LANDMARKS)
+]
+
+# Visibility below which draw_landmarks leaves a landmark out
+DRAW_VISIBILITY_THRESHOLD = 0.5
+
+# Median landmark visibility below which the pose track is considered lost
+MIN_TRACKING_VISIBILITY = 0.5
+
+# Set to "cuda" to decode videos with NVDEC through torchcodec when an NVIDIA GPU is available
+VIDEO_DECODE_DEVICE = os.environ.get("VIDEO_DECODE_DEVICE", "cpu")
+
+# Number of frames torchcodec decodes and resizes on the GPU at a time
+CUDA_DECODE_BATCH = 32
+
+# Variant of the mp.solutions.pose model: 0 (lite), 1 (full) or 2 (heavy). Lower
+# complexities trade some landmark accuracy for faster inference on the CPU
+POSE_MODEL_COMPLEXITY = int(os.environ.get("POSE_MODEL_COMPLEXITY", "2"))
 
-def extract_frames(video_path, max_frames=300):
+# Path to a MediaPipe Tasks pose landmarker model (e.g. pose_landmarker_heavy.task).
+# When set, inference runs through the Tasks API on the GPU delegate instead of mp.solutions.pose
+POSE_LANDMARKER_MODEL = os.environ.get("POSE_LANDMARKER_MODEL")
+
+# Print per-frame debug information while processing. Off by default since it
+# scans every frame for its value range
+DEBUG_FRAMES = os.environ.get("CRICKET_DEBUG_FRAMES") == "1"
+
+# Default short side in pixels that frames are downscaled to before pose estimation
+DEFAULT_ANALYSIS_RESOLUTION = 384
+
+# Reused image buffers for the frames processed in this process
+_frame_pool = utils.FrameBufferPool()
+
+@st.cache_resource
+def get_pose():
     """
-    Extract frames from a video file
+    Get the shared MediaPipe Pose model
+    
+    The model runs in tracking mode: once a person has been detected, the
+    region of interest for each frame is derived from the previous frame's
+    landmarks, so the person detector only runs again when tracking is lost.
+    Segmentation is disabled since only the landmarks are used.
+    
+    Returns:
+        mediapipe.solutions.pose.Pose: Pose model
+    """
+    return mp_pose.Pose(
+        static_image_mode=False,
+        model_complexity=POSE_MODEL_COMPLEXITY,
+        enable_segmentation=False,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.4
+    )
+
+@st.cache_resource
+def get_pose_landmarker():
+    """
+    Get the shared MediaPipe Tasks pose landmarker
+    
+    The landmarker runs in video mode on the GPU delegate, falling back to the
+    CPU delegate if no GPU context can be created.
+    
+    Returns:
+        mediapipe.tasks.python.vision.PoseLandmarker: Pose landmarker
+    """
+    def create(delegate):
+        options = mp_vision.PoseLandmarkerOptions(
+            base_options=mp_tasks.BaseOptions(model_asset_path=POSE_LANDMARKER_MODEL, delegate=delegate),
+            running_mode=mp_vision.RunningMode.VIDEO,
+            num_poses=1,
+            min_pose_detection_confidence=0.5,
+            min_tracking_confidence=0.4
+        )
+        return mp_vision.PoseLandmarker.create_from_options(options)
+    
+    try:
+        return create(mp_tasks.BaseOptions.Delegate.GPU)
+    except Exception as e:
+        print(f"GPU delegate unavailable, using CPU: {str(e)}")
+        return create(mp_tasks.BaseOptions.Delegate.CPU)
+
+def _detect_pose(frame, timestamp_ms):
+    """
+    Run pose detection on a single frame
+    
+    Args:
+        frame (numpy.ndarray): Input frame in RGB format
+        timestamp_ms (int): Frame timestamp, required by the Tasks landmarker
+        
+    Returns:
+        NormalizedLandmarkList: Pose landmarks, or None if no pose was detected
+    """
+    if POSE_LANDMARKER_MODEL:
+        result = get_pose_landmarker().detect_for_video(
+            mp.Image(image_format=mp.ImageFormat.SRGB, data=frame), timestamp_ms
+        )
+        if not result.pose_landmarks:
+            return None
+        
+        # Repack into the protobuf type used by mp.solutions so drawing works unchanged
+        landmarks = landmark_pb2.NormalizedLandmarkList()
+        landmarks.landmark.extend(
+            landmark_pb2.NormalizedLandmark(x=lm.x, y=lm.y, z=lm.z, visibility=lm.visibility)
+            for lm in result.pose_landmarks[0]
+        )
+        return landmarks
+    
+    pose = get_pose()
+    results = pose.process(frame)
+    if not results or not results.pose_landmarks:
+        return None
+    
+    # Force a fresh detection on the next frame if the track has drifted
+    visibility = np.median([landmark.visibility for landmark in results.pose_landmarks.landmark])
+    if visibility < MIN_TRACKING_VISIBILITY:
+        pose.reset()
+    return results.pose_landmarks
+
+def _reset_tracking():
+    """
+    Make the next frame start from a fresh pose detection
+    """
+    # The Tasks landmarker tracks by timestamp, so only the solutions graph needs a reset
+    if not POSE_LANDMARKER_MODEL:
+        get_pose().reset()
+
+def _probe_video(video_path):
+    """
+    Read the frame rate, frame count and frame size of a video file
     
     Args:
         video_path (str): Path to video file
-        max_frames (int): Maximum number of frames to extract
         
     Returns:
-        tuple: (list of frames, fps)
+        tuple: (fps, total number of frames, width, height)
+    """
+    if av is not None:
+        with av.open(video_path) as container:
+            stream = container.streams.video[0]
+            fps = float(stream.average_rate or 0)
+            total_frames = stream.frames
+            if not total_frames:
+                # Some containers don't record a frame count, so estimate it from the duration
+                if stream.duration is not None:
+                    total_frames = int(stream.duration * stream.time_base * fps)
+                elif container.duration is not None:
+                    total_frames = int(container.duration / av.time_base * fps)
+            width = stream.codec_context.width
+            height = stream.codec_context.height
+            
+            # Report the displayed size of portrait clips, whose frames are stored sideways
+            # with a rotation in their display matrix, as OpenCV does
+            first_frame = next(container.decode(stream), None)
+            if first_frame is not None and first_frame.rotation % 180:
+                width, height = height, width
+            return fps, int(total_frames or 0), width, height
+    
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError("Error opening video file")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    return fps, total_frames, width, height
+
+def _decode_frames_pyav(video_path, sample_every, size):
     """
+    Decode every nth frame of a video with PyAV (FFmpeg)
+    
+    Frames are turned upright using the rotation in the stream's display
+    matrix, which PyAV leaves to the caller unlike OpenCV.
+    
+    Args:
+        video_path (str): Path to video file
+        sample_every (int): Keep one frame out of every sample_every frames
+        size (tuple): Output (width, height), in the displayed orientation
+        
+    Yields:
+        numpy.ndarray: Frame in RGB format
+    """
+    width, height = size
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        # Let FFmpeg decode with frame and slice threading
+        stream.thread_type = 'AUTO'
+        
+        for frame_count, frame in enumerate(container.decode(stream)):
+            # Skipped frames are never converted out of the decoder's pixel format
+            if frame_count % sample_every == 0:
+                # The rotation is counterclockwise in degrees, a multiple of 90 in practice
+                quarter_turns = frame.rotation // 90
+                if quarter_turns % 2:
+                    scaled_width, scaled_height = height, width
+                else:
+                    scaled_width, scaled_height = width, height
+                
+                # Scale and convert to RGB in a single swscale pass
+                rgb_frame = frame.to_ndarray(width=scaled_width, height=scaled_height, format='rgb24', interpolation='AREA')
+                if quarter_turns % 4:
+                    rgb_frame = np.ascontiguousarray(np.rot90(rgb_frame, k=quarter_turns))
+                yield rgb_frame
+
+def _cuda_decode_available():
+    """
+    Check whether videos should be decoded on the GPU
+    
+    Returns:
+        bool: True if GPU decoding is enabled and torchcodec can use CUDA
+    """
+    if VIDEO_DECODE_DEVICE != "cuda":
+        return False
     try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            st.error("Error opening video file")
-            return [], 0
+        import torch
+        import torchcodec  # noqa: F401
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+def _decode_frames_cuda(video_path, sample_every, size):
+    """
+    Decode every nth frame of a video on the GPU with torchcodec (NVDEC)
+    
+    Frames are decoded and resized in batches on the GPU, and only the
+    downscaled batch is copied back to host memory for pose estimation.
+    
+    Args:
+        video_path (str): Path to video file
+        sample_every (int): Keep one frame out of every sample_every frames
+        size (tuple): Output (width, height)
         
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    Yields:
+        numpy.ndarray: Frame in RGB format
+    """
+    import torch
+    from torchcodec.decoders import VideoDecoder
+    
+    width, height = size
+    decoder = VideoDecoder(video_path, device="cuda")
+    num_frames = len(decoder)
+    
+    # Use the range API so NVDEC decodes whole runs of frames per call
+    step = sample_every * CUDA_DECODE_BATCH
+    for start in range(0, num_frames, step):
+        batch = decoder.get_frames_in_range(start, min(start + step, num_frames), step=sample_every).data
+        if batch.shape[-2:] != (height, width):
+            batch = torch.nn.functional.interpolate(batch.float(), size=(height, width), mode='area')
+            batch = batch.round_().clamp_(0, 255).to(torch.uint8)
         
-        # Calculate frame sampling rate if there are too many frames
-        sample_every = max(1, total_frames // max_frames)
+        # (B, C, H, W) on the GPU to (B, H, W, C) on the host
+        yield from batch.permute(0, 2, 3, 1).contiguous().cpu().numpy()
+
+def _decode_frames_opencv(video_path, sample_every, size):
+    """
+    Decode every nth frame of a video with OpenCV
+    
+    Args:
+        video_path (str): Path to video file
+        sample_every (int): Keep one frame out of every sample_every frames
+        size (tuple): Output (width, height)
         
-        frames = []
+    Yields:
+        numpy.ndarray: Frame in RGB format
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
         frame_count = 0
-        
         while True:
+            # Only process every nth frame if needed; skipped frames are grabbed
+            # without being converted into images
+            if frame_count % sample_every != 0:
+                if not cap.grab():
+                    break
+                frame_count += 1
+                continue
+            
             ret, frame = cap.read()
             if not ret:
                 break
             
-            # Only process every nth frame if needed
-            if frame_count % sample_every == 0:
-                # Convert from BGR to RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frames.append(frame_rgb)
+            if (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            # Convert from BGR to RGB, after downscaling so fewer pixels are converted
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             
             frame_count += 1
-        
+    finally:
         cap.release()
-        
-        st.info(f"Extracted {len(frames)} frames from video at {fps:.2f} fps")
-        return frames, fps
+
+def extract_frames(video_path, max_frames=300, max_short_side=DEFAULT_ANALYSIS_RESOLUTION):
+    """
+    Extract frames from a video file
+    
+    Frames are decoded lazily as the returned generator is consumed, so only
+    the frames currently being worked on are held in memory. PyAV is used for
+    decoding when it is installed, with OpenCV as a fallback. Setting
+    VIDEO_DECODE_DEVICE=cuda decodes on an NVIDIA GPU through torchcodec
+    instead, when it is available.
+    
+    Frames are downscaled so their short side is at most max_short_side
+    pixels, which is about where pose landmark accuracy levels off. When the
+    video doesn't report a frame count, every frame is decoded and the
+    expected number of frames is only an estimate.
     
+    Args:
+        video_path (str): Path to video file
+        max_frames (int): Maximum number of frames to extract
+        max_short_side (int): Maximum length of the short side of extracted frames
+        
+    Returns:
+        tuple: (generator of frames, fps, expected number of frames, scale factor)
+    """
+    try:
+        fps, total_frames, width, height = _probe_video(video_path)
     except Exception as e:
         st.error(f"Error processing video: {str(e)}")
-        return [], 0
+        return iter(()), 0, 0, 1.0
+    
+    # Calculate frame sampling rate if there are too many frames
+    if total_frames > 0:
+        sample_every = max(1, total_frames // max_frames)
+        expected_frames = len(range(0, total_frames, sample_every))
+    else:
+        # The frame count is unknown, so keep every frame and size the batches from an estimate
+        sample_every = 1
+        expected_frames = max_frames
+    
+    # Calculate the scale factor applied to every frame
+    scale = min(1.0, max_short_side / min(width, height)) if width and height else 1.0
+    size = (int(round(width * scale)), int(round(height * scale)))
+    
+    # Decoding errors are left to propagate: the generator is consumed on a prefetch
+    # thread, which hands them to the caller instead of losing them
+    def frames():
+        if _cuda_decode_available():
+            yield from _decode_frames_cuda(video_path, sample_every, size)
+        elif av is not None:
+            yield from _decode_frames_pyav(video_path, sample_every, size)
+        else:
+            yield from _decode_frames_opencv(video_path, sample_every, size)
+    
+    return frames(), fps, expected_frames, scale
 
-def process_frame(frame):
+def process_frame(frame, timestamp_ms=0, out=None):
     """
     Process a single frame with MediaPipe Pose model
     
     Args:
         frame (numpy.ndarray): Input frame in RGB format
+        timestamp_ms (int): Frame timestamp; must increase between calls when using the Tasks landmarker
+        out (numpy.ndarray): Optional buffer with the frame's shape to draw into instead of a new copy;
+            pass the frame itself to draw on it in place
         
     Returns:
         tuple: (processed frame with landmarks drawn, pose landmarks)
     """
     try:
-        # Make a copy of the frame for drawing
-        output_frame = frame.copy()
+        # Copy the frame into the drawing buffer, unless the caller lets it be drawn on directly
+        if out is None:
+            output_frame = frame.copy()
+        else:
+            if out is not frame:
+                np.copyto(out, frame)
+            output_frame = out
         
         # Get image dimensions
         height, width = frame.shape[:2]
         
         # Print frame information for debugging
-        print(f"Processing frame: shape={frame.shape}, dtype={frame.dtype}, min={np.min(frame)}, max={np.max(frame)}")
+        if DEBUG_FRAMES:
+            print(f"Processing frame: shape={frame.shape}, dtype={frame.dtype}, min={np.min(frame)}, max={np.max(frame)}")
         
         # Process the frame with MediaPipe
         # The frame is already in the correct format for MediaPipe Pose
-        results = pose.process(frame)
+        pose_landmarks = _detect_pose(frame, timestamp_ms)
         
         # Check if pose landmarks were detected
-        if results and results.pose_landmarks:
+        if pose_landmarks is not None:
             # Draw the pose landmarks on the frame
-            mp_drawing.draw_landmarks(
-                output_frame, 
-                results.pose_landmarks, 
-                mp_pose.POSE_CONNECTIONS,
-                landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style()
-            )
+            draw_pose_landmarks(output_frame, biomechanics.landmarks_to_array(pose_landmarks))
             
             # Return the processed frame and the landmarks
-            return output_frame, results.pose_landmarks
+            return output_frame, pose_landmarks
         else:
             # Return the original frame if no landmarks were detected
-            print("No pose landmarks detected in frame")
+            if DEBUG_FRAMES:
+                print("No pose landmarks detected in frame")
             return output_frame, None
             
     except Exception as e:
@@ -128,35 +442,353 @@ def process_frame(frame):
             blank_frame = np.zeros((480, 640, 3), dtype=np.uint8)
             return blank_frame, None
 
+def save_frame(frame_path, frame, quality=85):
+    """
+    Save an RGB frame to disk as a JPEG
+    
+    Args:
+        frame_path (str): Destination path
+        frame (numpy.ndarray): Frame in RGB format
+        quality (int): JPEG quality (0-100)
+    """
+    bgr_frame = _frame_pool.acquire(frame.shape, frame.dtype)
+    cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=bgr_frame)
+    cv2.imwrite(frame_path, bgr_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    _frame_pool.release(bgr_frame)
+
+def draw_pose_landmarks(frame, landmark_array):
+    """
+    Draw pose landmarks and the skeleton connecting them onto a frame in place
+    
+    The result matches mp_drawing.draw_landmarks with the default pose style,
+    but all connections are drawn in a single cv2.polylines call straight from
+    the landmark array instead of one cv2.line call per connection.
+    
+    Args:
+        frame (numpy.ndarray): Frame in RGB format, drawn on in place
+        landmark_array (numpy.ndarray): Array of shape (33, 4) from landmarks_to_array
+    """
+    h, w = frame.shape[:2]
+    landmark_array = landmark_array.astype(np.float64)
+    x, y, visibility = landmark_array[:, 0], landmark_array[:, 1], landmark_array[:, 3]
+    
+    # Like draw_landmarks, leave out hidden landmarks and those outside the frame
+    visible = (visibility >= DRAW_VISIBILITY_THRESHOLD) & (x >= 0) & (x <= 1) & (y >= 0) & (y <= 1)
+    points = np.zeros((len(landmark_array), 2), dtype=np.int32)
+    points[visible, 0] = np.minimum(np.floor(x[visible] * w), w - 1)
+    points[visible, 1] = np.minimum(np.floor(y[visible] * h), h - 1)
+    
+    connections = _POSE_CONNECTIONS[visible[_POSE_CONNECTIONS].all(axis=1)]
+    if len(connections):
+        cv2.polylines(frame, list(points[connections]), False, _CONNECTION_STYLE.color, _CONNECTION_STYLE.thickness)
+    
+    for idx in np.flatnonzero(visible).tolist():
+        style = _LANDMARK_STYLES[idx]
+        center = (int(points[idx, 0]), int(points[idx, 1]))
+        border_radius = max(style.circle_radius + 1, int(style.circle_radius * 1.2))
+        cv2.circle(frame, center, border_radius, mp_drawing.WHITE_COLOR, style.thickness)
+        cv2.circle(frame, center, style.circle_radius, style.color, style.thickness)
+
+def _interpolate_landmarks(landmark_arrays, keyframes):
+    """
+    Fill in the landmarks of skipped frames from the keyframes either side
+    
+    Frames between two keyframes that both have a pose are linearly
+    interpolated; the others are left without a pose.
+    
+    Args:
+        landmark_arrays (list): Landmark array or None per frame, filled in place
+        keyframes (list): Sorted offsets of the frames pose estimation ran on
+    """
+    for left, right in zip(keyframes, keyframes[1:]):
+        start, end = landmark_arrays[left], landmark_arrays[right]
+        if start is None or end is None:
+            continue
+        for offset in range(left + 1, right):
+            t = (offset - left) / (right - left)
+            landmark_arrays[offset] = (start + (end - start) * t).astype(np.float32)
+
+def _finish_frame(processed_frame, landmarks, frame_path):
+    """
+    Save an annotated frame and convert its landmarks to an array
+    
+    Args:
+        processed_frame (numpy.ndarray): Annotated frame in RGB format
+        landmarks: MediaPipe pose landmarks, or None if no pose was detected
+        frame_path (str): Path the annotated frame is written to
+        
+    Returns:
+        numpy.ndarray: Landmark array, or None if no pose was detected
+    """
+    save_frame(frame_path, processed_frame)
+    
+    # Send landmarks back as a plain array rather than a protobuf message
+    if landmarks is None:
+        return None
+    return biomechanics.landmarks_to_array(landmarks)
+
+def _save_interpolated_frame(frame, landmark_array, frame_path):
+    """
+    Draw interpolated landmarks onto a skipped frame and save it
+    
+    Args:
+        frame (numpy.ndarray): Frame in RGB format
+        landmark_array (numpy.ndarray): Interpolated landmarks, or None
+        frame_path (str): Path the annotated frame is written to
+    """
+    output_frame = _frame_pool.acquire(frame.shape, np.uint8)
+    np.copyto(output_frame, frame)
+    if landmark_array is not None:
+        draw_pose_landmarks(output_frame, landmark_array)
+    save_frame(frame_path, output_frame)
+    _frame_pool.release(output_frame)
+
+def process_frames_batch(batch, start_index, frames_dir, frame_scale=1.0, fps=30.0, stride=1):
+    """
+    Process a batch of consecutive frames
+    
+    Pose inference runs back to back on this thread while a second thread
+    encodes the annotated frames. With a stride above 1, inference only runs
+    on every stride-th frame (and the batch's first and last frames) and the
+    landmarks of the frames in between are interpolated, since the bowling
+    action is smooth over a few frames. The biomechanics of the whole batch are then
+    measured in a single compiled call.
+    
+    Args:
+        batch (numpy.ndarray): Stacked frames in RGB format, shape (B, H, W, 3)
+        start_index (int): Index of the first frame in the batch
+        frames_dir (str): Directory the annotated frames are written to
+        frame_scale (float): Scale factor the frames were downscaled by
+        fps (float): Frame rate of the extracted frames
+        stride (int): Run pose estimation on one frame out of every stride frames
+        
+    Returns:
+        tuple: (annotated frame paths, (B, 33, 4) landmarks array with NaN rows for
+            frames without a pose, (B, len(METRIC_KEYS)) measurements array)
+    """
+    # The previous batch this process handled isn't adjacent, so start from a fresh detection
+    _reset_tracking()
+    
+    frame_paths = [
+        os.path.join(frames_dir, utils.frame_filename(idx))
+        for idx in range(start_index, start_index + len(batch))
+    ]
+    keyframes = [
+        offset for offset in range(len(batch))
+        if (start_index + offset) % stride == 0 or offset in (0, len(batch) - 1)
+    ]
+    landmark_arrays = [None] * len(batch)
+    
+    finished = []
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for offset in keyframes:
+            # Keyframe pixels aren't needed again once annotated, so draw on the batch itself
+            frame = batch[offset]
+            timestamp_ms = int((start_index + offset) * 1000 / (fps or 30))
+            processed_frame, landmarks = process_frame(frame, timestamp_ms, out=frame)
+            finished.append(writer.submit(_finish_frame, processed_frame, landmarks, frame_paths[offset]))
+            
+            # Don't let annotated frames pile up if the writer falls behind
+            if len(finished) >= 2:
+                finished[-2].result()
+        
+        for offset, future in zip(keyframes, finished):
+            landmark_arrays[offset] = future.result()
+    
+    # Fill in and draw the frames pose estimation skipped
+    if len(keyframes) < len(batch):
+        _interpolate_landmarks(landmark_arrays, keyframes)
+        keyframe_set = set(keyframes)
+        for offset in range(len(batch)):
+            if offset not in keyframe_set:
+                _save_interpolated_frame(batch[offset], landmark_arrays[offset], frame_paths[offset])
+    
+    # Measure the whole batch at once, in the source video's pixel coordinates
+    landmarks = np.full((len(batch), biomechanics.NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    for offset, landmark_array in enumerate(landmark_arrays):
+        if landmark_array is not None:
+            landmarks[offset] = landmark_array
+    source_shape = (batch.shape[1] / frame_scale, batch.shape[2] / frame_scale)
+    metrics = biomechanics.compute_metrics(landmarks, source_shape)
+    
+    # Return the arrays as they are so they pickle back to the parent as two buffers
+    return frame_paths, landmarks, metrics
+
+def _prefetch(iterable, maxsize):
+    """
+    Iterate over an iterable on a background thread
+    
+    Items are produced ahead of the consumer into a bounded queue, so the
+    producer blocks once maxsize items are waiting.
+    
+    Args:
+        iterable (iterable): Items to produce
+        maxsize (int): Maximum number of items produced ahead
+        
+    Yields:
+        Items from the iterable, in order
+    """
+    items = queue.Queue(maxsize=maxsize)
+    done = object()
+    stop = threading.Event()
+    
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                items.put(item)
+            items.put(done)
+        except BaseException as e:
+            items.put(e)
+    
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Unblock the producer if the consumer stops early
+        stop.set()
+        while thread.is_alive():
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                thread.join(0.05)
+
+def _stacked_batches(frames, batch_size):
+    """
+    Group frames into stacked batches
+    
+    Args:
+        frames (iterable): Frames in RGB format
+        batch_size (int): Number of frames per batch
+        
+    Yields:
+        numpy.ndarray: Stacked frames, shape (B, H, W, 3)
+    """
+    frames = iter(frames)
+    while True:
+        batch = list(itertools.islice(frames, batch_size))
+        if not batch:
+            return
+        yield np.stack(batch)
+
+def _batch_results(start_index, result):
+    """
+    Split the arrays returned by process_frames_batch into per-frame tuples
+    """
+    frame_paths, landmarks, metrics = result
+    for offset, frame_path in enumerate(frame_paths):
+        yield start_index + offset, frame_path, landmarks[offset], metrics[offset]
+
+def process_frames_parallel(frames, num_frames, frames_dir, frame_scale=1.0, fps=30.0, stride=1, num_workers=None):
+    """
+    Process frames across a pool of worker processes
+    
+    Frames are split into contiguous batches so that each worker's pose model
+    keeps tracking between consecutive frames. Each batch is sent to its
+    worker as one stacked array, which pickles as a single buffer. Frames are
+    decoded on a background thread a few batches ahead of the workers, and
+    results are yielded as batches complete, so they are not in frame order. Annotated frames are
+    written to frames_dir as JPEGs rather than sent back to the caller.
+    
+    Args:
+        frames (iterable): Frames in RGB format
+        num_frames (int): Expected number of frames, used to size the batches
+        frames_dir (str): Directory the annotated frames are written to
+        frame_scale (float): Scale factor the frames were downscaled by
+        fps (float): Frame rate of the extracted frames
+        stride (int): Run pose estimation on one frame out of every stride frames
+        num_workers (int): Number of worker processes (defaults to the CPU count, at most 4)
+        
+    Yields:
+        tuple: (frame index, annotated frame path, (33, 4) landmark array, measurements
+            array in METRIC_KEYS order), with NaN landmarks and measurements for frames without a pose
+    """
+    if num_frames <= 0:
+        return
+    
+    if num_workers is None:
+        num_workers = min(4, os.cpu_count() or 1)
+    num_workers = max(1, min(num_workers, num_frames))
+    
+    # Use several batches per worker so progress can be reported as they finish
+    batch_size = max(1, -(-num_frames // (4 * num_workers)))
+    start_index = 0
+    
+    # Decode the next batches on a background thread while the workers are busy
+    batches = _prefetch(_stacked_batches(frames, batch_size), num_workers)
+    
+    # Spawn fresh workers so each one builds its own MediaPipe graph
+    mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context) as executor:
+        pending = {}
+        for batch in batches:
+            future = executor.submit(
+                process_frames_batch, batch, start_index, frames_dir, frame_scale, fps, stride
+            )
+            pending[future] = start_index
+            start_index += len(batch)
+            # Leave the executor's queue holding the only reference to the batch
+            del batch
+            
+            # Bound the number of decoded frames waiting on the workers
+            if len(pending) >= 2 * num_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from _batch_results(pending.pop(future), future.result())
+        
+        for future in as_completed(list(pending)):
+            yield from _batch_results(pending.pop(future), future.result())
+
+def _pixel_landmarks(landmarks, frame_shape):
+    """
+    Get the pixel coordinates and visibility of pose landmarks as arrays
+    
+    Args:
+        landmarks: MediaPipe pose landmarks, or an array from landmarks_to_array
+        frame_shape: Shape of the frame (height, width)
+        
+    Returns:
+        tuple: (x array, y array, visibility array), with coordinates truncated to ints
+    """
+    if not isinstance(landmarks, np.ndarray):
+        landmarks = biomechanics.landmarks_to_array(landmarks)
+    h, w = frame_shape[:2]
+    landmarks = landmarks.astype(np.float64)
+    xs = (landmarks[:, 0] * w).astype(np.int64)
+    ys = (landmarks[:, 1] * h).astype(np.int64)
+    return xs, ys, landmarks[:, 3]
+
 def crop_frame_to_person(frame, landmarks, padding=50):
     """
     Crop frame to the area containing the person
     
     Args:
         frame (numpy.ndarray): Input frame
-        landmarks: MediaPipe pose landmarks
+        landmarks: MediaPipe pose landmarks, or an array from landmarks_to_array
         padding (int): Padding around the person
         
     Returns:
         numpy.ndarray: Cropped frame
     """
-    if landmarks is None:
+    if landmarks is None or (isinstance(landmarks, np.ndarray) and np.isnan(landmarks).all()):
         return frame
     
     h, w = frame.shape[:2]
     
     # Get the bounding box of the person
-    x_min = w
-    y_min = h
-    x_max = 0
-    y_max = 0
-    
-    for landmark in landmarks.landmark:
-        x, y = int(landmark.x * w), int(landmark.y * h)
-        x_min = min(x_min, x)
-        y_min = min(y_min, y)
-        x_max = max(x_max, x)
-        y_max = max(y_max, y)
+    xs, ys, _ = _pixel_landmarks(landmarks, frame.shape)
+    x_min = min(w, int(xs.min()))
+    y_min = min(h, int(ys.min()))
+    x_max = max(0, int(xs.max()))
+    y_max = max(0, int(ys.max()))
     
     # Add padding
     x_min = max(0, x_min - padding)
@@ -174,7 +806,7 @@ def get_landmark_coordinates(landmarks, frame_shape):
     Get the x, y coordinates of pose landmarks
     
     Args:
-        landmarks: MediaPipe pose landmarks
+        landmarks: MediaPipe pose landmarks, or an array from landmarks_to_array
         frame_shape: Shape of the frame (height, width)
         
     Returns:
@@ -183,18 +815,9 @@ def get_landmark_coordinates(landmarks, frame_shape):
     if landmarks is None:
         return None
     
-    h, w = frame_shape[:2]
-    coords = {}
-    
-    # Extract coordinates for each landmark
-    for idx, landmark in enumerate(landmarks.landmark):
-        x = int(landmark.x * w)
-        y = int(landmark.y * h)
-        visibility = landmark.visibility
-        coords[idx] = {
-            'x': x, 
-            'y': y, 
-            'visibility': visibility
-        }
-    
-    return coords
+    # Convert every landmark at once, then build the per-landmark entries
+    xs, ys, visibility = _pixel_landmarks(landmarks, frame_shape)
+    return {
+        idx: {'x': x, 'y': y, 'visibility': v}
+        for idx, (x, y, v) in enumerate(zip(xs.tolist(), ys.tolist(), visibility.tolist()))
+    }
@@ -4,6 +4,30 @@ import plotly.express as px
 import pandas as pd
 import numpy as np
 from plotly.subplots import make_subplots
+import utils
+
+# Longest series sent to the browser per trace; longer ones are downsampled
+MAX_PLOT_POINTS = 2000
+
+def _plot_points(x, y):
+    """
+    Get the points of a series to plot, downsampled if it is long
+    
+    The points are sent as float32, which plotly ships to the browser as
+    binary typed arrays at half the size of float64.
+    
+    Args:
+        x (numpy.ndarray): Sample positions
+        y (numpy.ndarray): Sample values
+        
+    Returns:
+        dict: x and y keyword arguments for go.Scatter
+    """
+    x, y = utils.downsample_lttb(x, y, MAX_PLOT_POINTS)
+    return {
+        'x': np.ascontiguousarray(x, dtype=np.float32),
+        'y': np.ascontiguousarray(y, dtype=np.float32),
+    }
 
 def plot_time_series(biomechanics_data, fps):
     """
@@ -19,163 +43,69 @@ def plot_time_series(biomechanics_data, fps):
     
     # Create time values (in seconds)
     frames = len(list(biomechanics_data.values())[0])  # Length of first data series
-    time = np.arange(frames) / fps
+    time = np.arange(frames, dtype=np.float32) / np.float32(fps)
     
-    # Create tabs for different metric categories
-    tab1, tab2, tab3 = st.tabs(["Arm & Wrist Angles", "Body Alignment", "Other Metrics"])
+    # Approximate release as the point where arm angle is closest to 180 degrees
+    release_time = None
+    if 'arm_angle' in biomechanics_data:
+        release_time = np.argmin(np.abs(biomechanics_data['arm_angle'] - 180)) / fps
     
-    with tab1:
-        # Create figure for arm and wrist angles
-        fig = make_subplots(specs=[[{"secondary_y": False}]])
-        
-        # Add arm angle
-        if 'arm_angle' in biomechanics_data:
-            fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['arm_angle'], name="Arm Angle (°)"),
-                secondary_y=False,
-            )
-        
-        # Add wrist angle
-        if 'wrist_angle' in biomechanics_data:
-            fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['wrist_angle'], name="Wrist Angle (°)"),
-                secondary_y=False,
-            )
-        
-        # Add vertical line for release point if we can estimate it
-        # Approximate release as the point where arm angle is closest to 180 degrees
-        if 'arm_angle' in biomechanics_data:
-            release_idx = np.argmin(np.abs(biomechanics_data['arm_angle'] - 180))
-            release_time = release_idx / fps
-            
-            fig.add_vline(
-                x=release_time, 
-                line_width=2, 
-                line_dash="dash", 
-                line_color="red",
-                annotation_text="Est. Release",
-                annotation_position="top right"
-            )
-        
-        # Update layout
-        fig.update_layout(
-            title="Arm and Wrist Angles Over Time",
-            xaxis_title="Time (seconds)",
-            yaxis_title="Angle (degrees)",
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-            height=500
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+    # Series to plot as (row, key, trace name, on the secondary y-axis)
+    series = [
+        (1, 'arm_angle', "Arm Angle (°)", False),
+        (1, 'wrist_angle', "Wrist Angle (°)", False),
+        (2, 'trunk_angle', "Trunk Angle (°)", False),
+        (2, 'front_knee_angle', "Front Knee Angle (°)", False),
+        (2, 'back_knee_angle', "Back Knee Angle (°)", False),
+        (2, 'hip_shoulder_separation', "Hip-Shoulder Separation (°)", False),
+        (3, 'release_point_height', "Release Height (norm.)", False),
+        (3, 'release_point_horizontal', "Release Horizontal Pos. (norm.)", False),
+        (3, 'shoulder_rotation', "Shoulder Rotation (°)", True),
+    ]
     
-    with tab2:
-        # Create figure for body alignment metrics
-        fig = make_subplots(specs=[[{"secondary_y": False}]])
-        
-        # Add trunk angle
-        if 'trunk_angle' in biomechanics_data:
-            fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['trunk_angle'], name="Trunk Angle (°)"),
-                secondary_y=False,
-            )
-        
-        # Add front knee angle
-        if 'front_knee_angle' in biomechanics_data:
-            fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['front_knee_angle'], name="Front Knee Angle (°)"),
-                secondary_y=False,
-            )
-        
-        # Add back knee angle
-        if 'back_knee_angle' in biomechanics_data:
-            fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['back_knee_angle'], name="Back Knee Angle (°)"),
-                secondary_y=False,
-            )
-        
-        # Add hip-shoulder separation
-        if 'hip_shoulder_separation' in biomechanics_data:
-            fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['hip_shoulder_separation'], name="Hip-Shoulder Separation (°)"),
-                secondary_y=False,
-            )
-        
-        # Add vertical line for release point if we can estimate it
-        if 'arm_angle' in biomechanics_data:
-            release_idx = np.argmin(np.abs(biomechanics_data['arm_angle'] - 180))
-            release_time = release_idx / fps
-            
-            fig.add_vline(
-                x=release_time, 
-                line_width=2, 
-                line_dash="dash", 
-                line_color="red",
-                annotation_text="Est. Release",
-                annotation_position="top right"
-            )
-        
-        # Update layout
-        fig.update_layout(
-            title="Body Alignment Metrics Over Time",
-            xaxis_title="Time (seconds)",
-            yaxis_title="Angle (degrees)",
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-            height=500
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+    # Plot every metric category in one figure, stacked on a shared time axis
+    fig = make_subplots(
+        rows=3, cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.08,
+        subplot_titles=("Arm & Wrist Angles", "Body Alignment", "Other Metrics"),
+        specs=[[{"secondary_y": False}], [{"secondary_y": False}], [{"secondary_y": True}]]
+    )
     
-    with tab3:
-        # Create figure for other metrics
-        fig = make_subplots(specs=[[{"secondary_y": True}]])
-        
-        # Add normalized release point height
-        if 'release_point_height' in biomechanics_data:
-            fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['release_point_height'], name="Release Height (norm.)"),
-                secondary_y=False,
-            )
-        
-        # Add normalized release point horizontal position
-        if 'release_point_horizontal' in biomechanics_data:
+    for row, key, name, secondary_y in series:
+        if key in biomechanics_data:
             fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['release_point_horizontal'], name="Release Horizontal Pos. (norm.)"),
-                secondary_y=False,
+                go.Scatter(**_plot_points(time, biomechanics_data[key]), name=name),
+                row=row, col=1,
+                secondary_y=secondary_y,
             )
-        
-        # Add shoulder rotation
-        if 'shoulder_rotation' in biomechanics_data:
-            fig.add_trace(
-                go.Scatter(x=time, y=biomechanics_data['shoulder_rotation'], name="Shoulder Rotation (°)"),
-                secondary_y=True,
-            )
-        
-        # Add vertical line for release point if we can estimate it
-        if 'arm_angle' in biomechanics_data:
-            release_idx = np.argmin(np.abs(biomechanics_data['arm_angle'] - 180))
-            release_time = release_idx / fps
-            
-            fig.add_vline(
-                x=release_time, 
-                line_width=2, 
-                line_dash="dash", 
-                line_color="red",
-                annotation_text="Est. Release",
-                annotation_position="top right"
-            )
-        
-        # Update layout
-        fig.update_layout(
-            title="Other Biomechanical Metrics Over Time",
-            xaxis_title="Time (seconds)",
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-            height=500
+    
+    # Add vertical line for release point if we can estimate it
+    if release_time is not None:
+        fig.add_vline(
+            x=release_time, 
+            line_width=2, 
+            line_dash="dash", 
+            line_color="red",
+            annotation_text="Est. Release",
+            annotation_position="top right",
+            row="all", col=1
         )
-        
-        fig.update_yaxes(title_text="Normalized Position (0-1)", secondary_y=False)
-        fig.update_yaxes(title_text="Angle (degrees)", secondary_y=True)
-        
-        st.plotly_chart(fig, use_container_width=True)
+    
+    # Update layout
+    fig.update_layout(
+        title="Biomechanical Metrics Over Time",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        height=1200
+    )
+    
+    fig.update_xaxes(title_text="Time (seconds)", row=3, col=1)
+    fig.update_yaxes(title_text="Angle (degrees)", row=1, col=1)
+    fig.update_yaxes(title_text="Angle (degrees)", row=2, col=1)
+    fig.update_yaxes(title_text="Normalized Position (0-1)", row=3, col=1, secondary_y=False)
+    fig.update_yaxes(title_text="Angle (degrees)", row=3, col=1, secondary_y=True)
+    
+    st.plotly_chart(fig, use_container_width=True)
 
 def plot_technical_score_gauge(score):
     """
@@ -236,10 +166,10 @@ def plot_session_comparison(data1, data2, name1, name2, metrics1, metrics2):
         # Create a radar chart comparing key metrics
         if metrics1 and metrics2:
             # Identify common metrics that are numeric
-            common_metrics = []
-            for key in metrics1:
-                if key in metrics2 and isinstance(metrics1[key], (int, float)) and isinstance(metrics2[key], (int, float)):
-                    common_metrics.append(key)
+            common_metrics = [
+                key for key, value in metrics1.items()
+                if isinstance(value, (int, float)) and isinstance(metrics2.get(key), (int, float))
+            ]
             
             if common_metrics:
                 # Prepare data for radar chart
@@ -295,17 +225,15 @@ def plot_session_comparison(data1, data2, name1, name2, metrics1, metrics2):
                 
                 st.plotly_chart(fig, use_container_width=True)
                 
-                # Create a comparison table
-                comparison_data = []
-                for metric in common_metrics:
-                    comparison_data.append({
-                        'Metric': metric,
-                        name1: f"{metrics1[metric]:.1f}" if isinstance(metrics1[metric], (int, float)) else metrics1[metric],
-                        name2: f"{metrics2[metric]:.1f}" if isinstance(metrics2[metric], (int, float)) else metrics2[metric],
-                        'Change': f"{metrics2[metric] - metrics1[metric]:.1f}" if isinstance(metrics1[metric], (int, float)) and isinstance(metrics2[metric], (int, float)) else "N/A"
-                    })
-                
-                df = pd.DataFrame(comparison_data)
+                # Create a comparison table; every common metric is numeric
+                values1 = [metrics1[metric] for metric in common_metrics]
+                values2 = [metrics2[metric] for metric in common_metrics]
+                df = pd.DataFrame({
+                    'Metric': common_metrics,
+                    name1: [f"{value:.1f}" for value in values1],
+                    name2: [f"{value:.1f}" for value in values2],
+                    'Change': [f"{value2 - value1:.1f}" for value1, value2 in zip(values1, values2)]
+                })
                 st.dataframe(df, use_container_width=True)
             
             else:
@@ -329,14 +257,14 @@ def plot_session_comparison(data1, data2, name1, name2, metrics1, metrics2):
                     
                     # Add time series for first session
                     fig.add_trace(go.Scatter(
-                        y=data1[selected_metric],
+                        **_plot_points(np.arange(len(data1[selected_metric])), data1[selected_metric]),
                         mode='lines',
                         name=f"{name1}"
                     ))
                     
                     # Add time series for second session
                     fig.add_trace(go.Scatter(
-                        y=data2[selected_metric],
+                        **_plot_points(np.arange(len(data2[selected_metric])), data2[selected_metric]),
                         mode='lines',
                         name=f"{name2}"
                     ))